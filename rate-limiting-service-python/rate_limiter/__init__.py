@@ -4,15 +4,18 @@ Rate limiter package for API rate limiting.
 
 from .limiter import RateLimiter, RateLimitExceeded, create_limiter
 from .algorithms import TokenBucket, SlidingWindow
-from .storage import RedisStorage, MemoryStorage
+from .storage import RedisStorage, MemoryStorage, AtomicMemoryStorage
+from .types import RateLimitResult
 
 __version__ = '1.0.0'
 __all__ = [
     'RateLimiter',
     'RateLimitExceeded',
+    'RateLimitResult',
     'create_limiter',
     'TokenBucket',
     'SlidingWindow',
     'RedisStorage',
-    'MemoryStorage'
+    'MemoryStorage',
+    'AtomicMemoryStorage'
 ] 
\ No newline at end of file
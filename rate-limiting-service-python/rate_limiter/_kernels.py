@@ -0,0 +1,61 @@
+"""
+Numeric kernels for the rate limiting hot path.
+
+Compiled with Numba when it is installed, plain Python functions otherwise.
+"""
+
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
+
+
+@njit(cache=True)
+def sw_compute(now, interval_s, rate, cur, prev):
+    """
+    Sliding window decision for the given window counts.
+    
+    Args:
+        now: Current time in seconds
+        interval_s: Window size in seconds
+        rate: Request rate (requests per window)
+        cur: Request count in the current window
+        prev: Request count in the previous window
+        
+    Returns:
+        Tuple of (allowed, remaining, reset, current_window)
+    """
+    cw = now // interval_s * interval_s
+    pos = (now - cw) / interval_s
+    w = cur + prev * (1.0 - pos)
+    allowed = w < rate
+    rem = max(0, int(rate - w - (1 if allowed else 0)))
+    reset = interval_s - (now - cw)
+    return allowed, rem, reset, cw
+
+
+@njit(cache=True)
+def tb_consume(tokens, elapsed_ms, rate, refill_rate):
+    """
+    Token bucket refill and take for one bucket.
+    
+    Args:
+        tokens: Tokens after the last update
+        elapsed_ms: Milliseconds since the last update
+        rate: Bucket capacity
+        refill_rate: Tokens added per second
+        
+    Returns:
+        Tuple of (allowed, tokens left)
+    """
+    tokens = min(tokens + elapsed_ms / 1000 * refill_rate, rate)
+    allowed = tokens >= 1
+    return allowed, tokens - allowed
+
+
+# Compile (or load from the Numba cache) at import, not on the first request
+sw_compute(0, 60, 60, 0, 0)
+tb_consume(0.0, 0, 60, 1.0)
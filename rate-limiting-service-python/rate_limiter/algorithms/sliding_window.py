@@ -7,9 +7,29 @@ problem that can occur with fixed window rate limiting.
 """
 
 import time
-from typing import Dict, Any, Tuple
+import asyncio
+from typing import Dict, Any, Optional, Tuple
 
-from ..utils import get_interval_in_seconds
+from .._kernels import sw_compute
+from ..types import RateLimitResult
+from ..utils import INTERVALS, get_interval_in_seconds
+
+# Atomic check-and-increment executed server-side in a single round trip.
+# KEYS: current window key, previous window key
+# ARGV: rate, window position scaled by 1e6, key TTL in seconds
+# Returns {allowed, current_count, previous_count} after the update.
+_LUA_SW_CHECK = """
+local c = tonumber(redis.call('GET', KEYS[1]) or 0)
+local p = tonumber(redis.call('GET', KEYS[2]) or 0)
+local w = c + p * (1 - ARGV[2] / 1e6)
+if w < tonumber(ARGV[1]) then
+    redis.call('INCR', KEYS[1])
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+    return {1, c + 1, p}
+else
+    return {0, c, p}
+end
+"""
 
 
 class SlidingWindow:
@@ -27,59 +47,145 @@ class SlidingWindow:
         """
         self.storage = storage
         self.options = options or {}
+        self._use_lua = getattr(storage, 'supports_lua', False)
+        # In-process storages are checked without awaiting, see check_sync
+        self._sync = getattr(storage, 'supports_sync', False)
+        self._sw_sha = None
+        # The script reads both window keys, on a cluster they must share a
+        # slot: the identifier becomes the hash tag
+        self._window_key = b"sw:{%s}:%d" if getattr(storage, 'cluster', False) else b"sw:%s:%d"
+        # Serializes the read-then-increment fallback for storages without Lua
+        self._lock = asyncio.Lock()
         
-    async def check(self, identifier: str, options: Dict[str, Any] = None) -> Dict[str, Any]:
+    def _limit(self, options: Dict[str, Any] = None) -> Tuple[int, int]:
         """
-        Check if a request is allowed and update window counters.
+        Read the limit of a check from its options.
         
         Args:
-            identifier: Client identifier
             options: Rate limit options for this check
             
         Returns:
-            Dict containing the check result and metadata
+            Tuple of (rate, interval in seconds)
         """
         options = options or {}
         rate = options.get('rate', 60)
         interval = options.get('interval', 'minute')
-        interval_seconds = get_interval_in_seconds(interval)
+        return rate, INTERVALS.get(interval) or get_interval_in_seconds(interval)
+    
+    def _window_keys(self, identifier: str, interval_seconds: int, now: int) -> Tuple[bytes, bytes]:
+        """
+        Build the storage keys of the current and previous windows.
         
-        now = int(time.time())
+        Args:
+            identifier: Client identifier
+            interval_seconds: Window size in seconds
+            now: Current time in seconds
+            
+        Returns:
+            Tuple of (current window key, previous window key)
+        """
         current_window = now // interval_seconds * interval_seconds
-        previous_window = current_window - interval_seconds
-        
-        current_window_key = f"sw:{identifier}:{current_window}"
-        previous_window_key = f"sw:{identifier}:{previous_window}"
-        
-        # Get the current counts for both windows
-        current_count, previous_count = await self._get_window_counts(
-            current_window_key, previous_window_key)
-        
-        # Calculate window position (0 at start, 1 at end)
-        window_position = (now % interval_seconds) / interval_seconds
+        id_bytes = identifier.encode()
+        return (self._window_key % (id_bytes, current_window),
+                self._window_key % (id_bytes, current_window - interval_seconds))
+    
+    @staticmethod
+    def _result(now: int, interval_seconds: int, rate: int, current_count: int,
+                previous_count: int, allowed: Optional[bool] = None) -> RateLimitResult:
+        """
+        Decide a check from the window counts before it.
         
-        # Calculate weighted count using rolling window
-        weighted_count = current_count + previous_count * (1 - window_position)
+        Args:
+            now: Current time in seconds
+            interval_seconds: Window size in seconds
+            rate: Request rate (requests per window)
+            current_count: Request count in the current window
+            previous_count: Request count in the previous window
+            allowed: Decision already taken by the storage, if any
+            
+        Returns:
+            Check result and metadata
+        """
+        computed, remaining, reset, _ = sw_compute(
+            now, interval_seconds, rate, current_count, previous_count)
+        if allowed is None:
+            allowed = computed
+        return RateLimitResult(allowed, rate, remaining, reset, 0 if allowed else reset)
+    
+    async def check(self, identifier: str, options: Dict[str, Any] = None) -> RateLimitResult:
+        """
+        Check if a request is allowed and update window counters.
         
-        allowed = weighted_count < rate
+        Args:
+            identifier: Client identifier
+            options: Rate limit options for this check
+            
+        Returns:
+            Check result and metadata
+        """
+        if self._sync:
+            return self.check_sync(identifier, options)
+            
+        rate, interval_seconds = self._limit(options)
+        now = int(time.time())
+        current_window_key, previous_window_key = self._window_keys(identifier, interval_seconds, now)
         
-        if allowed:
-            await self.storage.incr(current_window_key)
-            # Store for 2x interval to ensure we keep previous window
-            await self.storage.expire(current_window_key, interval_seconds * 2)
+        if self._use_lua:
+            if self._sw_sha is None:
+                self._sw_sha = await self.storage.load_script(_LUA_SW_CHECK)
+                
+            # Calculate window position (0 at start, 1 at end)
+            window_position = (now % interval_seconds) / interval_seconds
+            
+            allowed, current_count, previous_count = await self.storage.evalsha(
+                self._sw_sha,
+                [current_window_key, previous_window_key],
+                [rate, int(window_position * 1_000_000), interval_seconds * 2])
+                
+            # The script returns counts including this request, the decision
+            # is made from the counts before it
+            return self._result(
+                now, interval_seconds, rate, current_count - allowed, previous_count, bool(allowed))
+            
+        async with self._lock:
+            result = self._result(now, interval_seconds, rate, *await self._get_window_counts(
+                current_window_key, previous_window_key))
+                
+            if result.allowed:
+                # Store for 2x interval to ensure we keep previous window
+                await self.storage.incr_with_expire(current_window_key, interval_seconds * 2)
+                
+        return result
+    
+    def check_sync(self, identifier: str, options: Dict[str, Any] = None) -> RateLimitResult:
+        """
+        Check a request against storage with synchronous methods (supports_sync).
         
-        remaining = max(0, int(rate - weighted_count - (1 if allowed else 0)))
-        reset = interval_seconds - (now % interval_seconds)
+        Args:
+            identifier: Client identifier
+            options: Rate limit options for this check
+            
+        Returns:
+            Check result and metadata
+        """
+        rate, interval_seconds = self._limit(options)
+        now = int(time.time())
+        current_window_key, previous_window_key = self._window_keys(identifier, interval_seconds, now)
         
-        return {
-            'allowed': allowed,
-            'limit': rate,
-            'remaining': remaining,
-            'reset': reset,
-            'retry_after': 0 if allowed else reset
-        }
+        # Other threads may check the same client, see MemoryStorage.sync_lock
+        with self.storage.sync_lock:
+            current_count, previous_count = self.storage._mget_native(
+                [current_window_key, previous_window_key])
+                
+            result = self._result(
+                now, interval_seconds, rate, int(current_count or 0), int(previous_count or 0))
+                
+            if result.allowed:
+                self.storage.incr_with_expire_sync(current_window_key, interval_seconds * 2)
+                
+        return result
     
-    async def _get_window_counts(self, current_key: str, previous_key: str) -> Tuple[int, int]:
+    async def _get_window_counts(self, current_key: bytes, previous_key: bytes) -> Tuple[int, int]:
         """
         Get the request counts for current and previous windows.
         
@@ -121,11 +227,7 @@ class SlidingWindow:
         interval_seconds = get_interval_in_seconds(interval)
         
         now = int(time.time())
-        current_window = now // interval_seconds * interval_seconds
-        previous_window = current_window - interval_seconds
-        
-        current_window_key = f"sw:{identifier}:{current_window}"
-        previous_window_key = f"sw:{identifier}:{previous_window}"
+        current_window_key, previous_window_key = self._window_keys(identifier, interval_seconds, now)
         
         await self.storage.set(current_window_key, "0")
         await self.storage.set(previous_window_key, "0")
@@ -146,11 +248,7 @@ class SlidingWindow:
         interval_seconds = get_interval_in_seconds(interval)
         
         now = int(time.time())
-        current_window = now // interval_seconds * interval_seconds
-        previous_window = current_window - interval_seconds
-        
-        current_window_key = f"sw:{identifier}:{current_window}"
-        previous_window_key = f"sw:{identifier}:{previous_window}"
+        current_window_key, previous_window_key = self._window_keys(identifier, interval_seconds, now)
         
         current_count, previous_count = await self._get_window_counts(
             current_window_key, previous_window_key)
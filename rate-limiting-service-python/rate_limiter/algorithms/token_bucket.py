@@ -1,7 +1,53 @@
 import time
-from typing import Dict, Any, Optional, Tuple
+import asyncio
+from typing import Dict, Any, Optional, Tuple, List, Union
 
-from ..utils import get_interval_in_seconds
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .._kernels import tb_consume
+from ..types import RateLimitResult
+from ..utils import INTERVALS, get_interval_in_seconds
+
+# Refill, consume and persist buckets atomically in a single round trip.
+# Bucket state is packed into one key as "{tokens}|{last_update_ms}".
+# KEYS: bucket keys, processed in order
+# ARGV: now (ms), then rate, refill rate (tokens per second), key TTL in seconds per key
+# Returns {allowed, tokens, ...} per key, tokens as a string to keep the fraction.
+_LUA_TB = """
+local now = tonumber(ARGV[1])
+local out = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[3 * i - 1])
+    local rr = tonumber(ARGV[3 * i])
+    local ttl = tonumber(ARGV[3 * i + 1])
+    local raw = redis.call('GET', key)
+    local t, lu
+    if raw then
+        local sep = string.find(raw, '|', 1, true)
+        if sep then
+            t = tonumber(string.sub(raw, 1, sep - 1))
+            lu = tonumber(string.sub(raw, sep + 1))
+        else
+            t = tonumber(raw)
+        end
+    end
+    if not t then t = rate end
+    if not lu then lu = now end
+    t = math.min(t + (now - lu) / 1000 * rr, rate)
+    local ok = 0
+    if t >= 1 then
+        t = t - 1
+        ok = 1
+    end
+    redis.call('SET', key, tostring(t) .. '|' .. ARGV[1], 'EX', ttl)
+    out[#out + 1] = ok
+    out[#out + 1] = tostring(t)
+end
+return out
+"""
 
 
 class TokenBucket:
@@ -9,70 +55,206 @@ class TokenBucket:
     def __init__(self, storage, options: Dict[str, Any] = None):
         self.storage = storage
         self.options = options or {}
+        self._use_lua = getattr(storage, 'supports_lua', False)
+        # Storages updating a packed bucket in one step, see AtomicMemoryStorage
+        self._packed_buckets = getattr(storage, 'supports_buckets', False)
+        # Storages keeping Python objects get the state tuple as is
+        self._native_state = getattr(storage, 'stores_objects', False)
+        # In-process storages are checked without awaiting, see check_sync
+        self._sync = getattr(storage, 'supports_sync', False)
+        self._tb_sha = None
+        # Buckets of different identifiers live in different cluster slots
+        self._cluster = getattr(storage, 'cluster', False)
+        # Serializes the read-modify-write fallback for storages without Lua
+        self._lock = asyncio.Lock()
         
-    async def check(self, identifier: str, options: Dict[str, Any] = None) -> Dict[str, Any]:
+    def _limit(self, options: Optional[Dict[str, Any]]) -> Tuple[int, int, float]:
+        # Rate, interval in seconds and refill rate (tokens per second) of a check
         options = options or {}
         rate = options.get('rate', 60)
         interval = options.get('interval', 'minute')
-        interval_seconds = get_interval_in_seconds(interval)
+        interval_seconds = INTERVALS.get(interval) or get_interval_in_seconds(interval)
+        return rate, interval_seconds, rate / interval_seconds
+    
+    @staticmethod
+    def _result(allowed: bool, tokens: float, rate: int, refill_rate: float) -> RateLimitResult:
+        # Seconds until the bucket is full if allowed, until the next token otherwise;
+        # allowed is used as 0/1 so the expression has no data-dependent branch
+        reset = int(((rate - tokens) * allowed + (1 - tokens) * (1 - allowed)) / refill_rate)
+        return RateLimitResult(allowed, rate, int(tokens), reset, reset * (1 - allowed))
+    
+    async def check(self, identifier: str, options: Dict[str, Any] = None) -> RateLimitResult:
+        if self._sync:
+            return self.check_sync(identifier, options)
+            
+        rate, interval_seconds, refill_rate = self._limit(options)
+        bucket_key = b"tb:%s" % identifier.encode()
         
-        bucket_key = f"tb:{identifier}"
-        last_update_key = f"tb:{identifier}:last"
+        if self._use_lua:
+            if self._tb_sha is None:
+                self._tb_sha = await self.storage.load_script(_LUA_TB)
+            
+            now = time.time_ns() // 1_000_000
+            allowed, tokens = await self.storage.evalsha(
+                self._tb_sha,
+                [bucket_key],
+                [now, rate, refill_rate, interval_seconds])
+            allowed = bool(allowed)
+            tokens = float(tokens)
+        else:
+            async with self._lock:
+                # One clock read per check, taken under the lock so it never
+                # precedes the last update
+                now = time.time_ns() // 1_000_000
+                tokens, last_update = await self._get_bucket_state(bucket_key, rate, now)
+                allowed, tokens = tb_consume(tokens, now - last_update, rate, refill_rate)
+                await self._store_bucket_state(bucket_key, tokens, now, interval_seconds)
         
-        current_tokens, last_update = await self._get_bucket_state(bucket_key, last_update_key, rate)
+        return self._result(allowed, tokens, rate, refill_rate)
+    
+    def check_sync(self, identifier: str, options: Dict[str, Any] = None) -> RateLimitResult:
+        # Same as check() for storages with supports_sync, without awaiting; other
+        # threads may check the same bucket, so the update holds the storage's sync_lock
+        rate, interval_seconds, refill_rate = self._limit(options)
+        bucket_key = b"tb:%s" % identifier.encode()
         
-        now = int(time.time() * 1000)
-        elapsed_ms = now - last_update
-        refill_rate = rate / interval_seconds
-        refill_tokens = (elapsed_ms / 1000) * refill_rate
+        if self._packed_buckets:
+            # Takes the lock and reads the clock itself
+            allowed, tokens = self.storage.consume_token(bucket_key, rate, refill_rate)
+        else:
+            with self.storage.sync_lock:
+                now = time.time_ns() // 1_000_000
+                tokens, last_update = self._decode_bucket_state(
+                    self.storage._get_native(bucket_key), rate, now)
+                allowed, tokens = tb_consume(tokens, now - last_update, rate, refill_rate)
+                self.storage.set_sync(bucket_key, self._encode_bucket_state(tokens, now), interval_seconds)
+                
+        return self._result(allowed, tokens, rate, refill_rate)
+    
+    async def check_many(self, identifiers: List[str], options: Union[Dict[str, Any], List[Dict[str, Any]]] = None) -> List[RateLimitResult]:
+        # Consume one token from each bucket with a single storage round trip for
+        # reads and one for writes, e.g. for IP + user + global limits on one request.
+        # options is either shared by all buckets or a list with one dict per bucket.
+        if not identifiers:
+            return []
+            
+        if options is None or isinstance(options, dict):
+            options = [options or {}] * len(identifiers)
+            
+        rates, intervals, refill_rates = zip(*(self._limit(opts) for opts in options))
         
-        new_tokens = min(current_tokens + refill_tokens, rate)
+        bucket_keys = [b"tb:%s" % identifier.encode() for identifier in identifiers]
         
-        allowed = new_tokens >= 1
-        if allowed:
-            new_tokens -= 1
+        if self._packed_buckets:
+            allowed, new_tokens = zip(*(
+                self.storage.consume_token(bucket_key, rate, refill_rate)
+                for bucket_key, rate, refill_rate in zip(bucket_keys, rates, refill_rates)))
+        elif self._use_lua:
+            if self._tb_sha is None:
+                self._tb_sha = await self.storage.load_script(_LUA_TB)
+                
+            now = time.time_ns() // 1_000_000
+            if self._cluster:
+                # One script call per bucket, a multi-key call would fail with
+                # CROSSSLOT; with batch_commands they still share a pipeline
+                replies = await asyncio.gather(*(
+                    self.storage.evalsha(self._tb_sha, [bucket_key], [now, *limit])
+                    for bucket_key, limit in zip(bucket_keys, zip(rates, refill_rates, intervals))))
+                flat = [value for reply in replies for value in reply]
+            else:
+                args = [now]
+                for limit in zip(rates, refill_rates, intervals):
+                    args.extend(limit)
+                flat = await self.storage.evalsha(self._tb_sha, bucket_keys, args)
+            allowed = [bool(ok) for ok in flat[0::2]]
+            new_tokens = [float(tokens) for tokens in flat[1::2]]
+        elif len(set(bucket_keys)) < len(bucket_keys):
+            # Repeated buckets must see each other's updates, go one by one
+            return [await self.check(identifier, opts) for identifier, opts in zip(identifiers, options)]
+        elif self._sync:
+            # Other threads may update the same buckets, see check_sync
+            with self.storage.sync_lock:
+                now = time.time_ns() // 1_000_000
+                allowed, new_tokens = self._consume_many(
+                    self.storage._mget_native(bucket_keys), rates, refill_rates, now)
+                self.storage.mset_sync(
+                    self._encode_bucket_states(bucket_keys, new_tokens, now), max(intervals))
+        else:
+            async with self._lock:
+                now = time.time_ns() // 1_000_000
+                allowed, new_tokens = self._consume_many(
+                    await self.storage.mget(bucket_keys), rates, refill_rates, now)
+                await self.storage.mset(
+                    self._encode_bucket_states(bucket_keys, new_tokens, now), max(intervals))
+                
+        return [
+            self._result(ok, t, rate, refill_rate)
+            for ok, t, rate, refill_rate in zip(allowed, new_tokens, rates, refill_rates)
+        ]
+    
+    def _consume_many(self, states: List[Any], rates: Tuple[int, ...], refill_rates: Tuple[float, ...],
+                      now: int) -> Tuple[List[bool], List[float]]:
+        # Refill and take one token from each bucket state read by check_many
+        tokens, last_update = zip(*(
+            self._decode_bucket_state(state, rate, now) for state, rate in zip(states, rates)))
             
-        await self._store_bucket_state(bucket_key, last_update_key, new_tokens, now, interval_seconds)
+        if np is None:
+            allowed, new_tokens = zip(*(
+                tb_consume(t, now - lu, rate, refill_rate)
+                for t, lu, rate, refill_rate in zip(tokens, last_update, rates, refill_rates)))
+            return list(allowed), list(new_tokens)
+            
+        tokens = np.fromiter(tokens, dtype=np.float64, count=len(states))
+        last_update = np.fromiter(last_update, dtype=np.float64, count=len(states))
         
-        ms_until_refill = ((rate - new_tokens) / refill_rate) * 1000 if allowed else ((1 - new_tokens) / refill_rate) * 1000
+        tokens = np.minimum(tokens + (now - last_update) / 1000 * np.array(refill_rates), rates)
+        allowed = tokens >= 1.0
+        tokens -= allowed
         
-        return {
-            'allowed': allowed,
-            'limit': rate,
-            'remaining': int(new_tokens),
-            'reset': int(ms_until_refill / 1000),
-            'retry_after': 0 if allowed else int(ms_until_refill / 1000)
-        }
+        return allowed.tolist(), tokens.tolist()
+    
+    def _encode_bucket_states(self, bucket_keys: List[bytes], tokens: List[float], now: int) -> Dict[bytes, Any]:
+        # One TTL is set for the batch, the caller passes the longest one so no
+        # bucket expires early
+        return {key: self._encode_bucket_state(t, now) for key, t in zip(bucket_keys, tokens)}
     
-    async def _get_bucket_state(self, bucket_key: str, last_update_key: str, rate: int) -> Tuple[float, int]:
-        current_tokens = await self.storage.get(bucket_key)
-        last_update = await self.storage.get(last_update_key)
+    async def _get_bucket_state(self, bucket_key: bytes, rate: int, now: int) -> Tuple[float, int]:
+        state = await self.storage.get(bucket_key)
+        return self._decode_bucket_state(state, rate, now)
+    
+    @staticmethod
+    def _decode_bucket_state(state, rate: int, now: int) -> Tuple[float, int]:
+        if state is None:
+            return float(rate), now
         
-        if current_tokens is None:
-            current_tokens = float(rate)
-        else:
-            current_tokens = float(current_tokens)
+        if isinstance(state, tuple):
+            return state
             
-        if last_update is None:
-            last_update = int(time.time() * 1000)
-        else:
-            last_update = int(last_update)
+        tokens, sep, last_update = state.partition('|')
+        if not sep:
+            # Bare token count without a timestamp
+            return float(tokens), now
             
-        return current_tokens, last_update
+        return float(tokens), int(last_update)
     
-    async def _store_bucket_state(self, bucket_key: str, last_update_key: str, 
-                                 tokens: float, update_time: int, ttl: int) -> None:
-        await self.storage.set(bucket_key, str(tokens), ttl)
-        await self.storage.set(last_update_key, str(update_time), ttl)
+    def _encode_bucket_state(self, tokens: float, update_time: int):
+        if self._native_state:
+            return tokens, update_time
+        return f"{tokens}|{update_time}"
+    
+    async def _store_bucket_state(self, bucket_key: bytes, tokens: float, update_time: int, ttl: int) -> None:
+        await self.storage.set(bucket_key, self._encode_bucket_state(tokens, update_time), ttl)
     
     async def reset(self, identifier: str, options: Dict[str, Any] = None) -> bool:
         options = options or {}
         rate = options.get('rate', 60)
         
-        bucket_key = f"tb:{identifier}"
-        last_update_key = f"tb:{identifier}:last"
+        bucket_key = b"tb:%s" % identifier.encode()
+        now = time.time_ns() // 1_000_000
         
-        await self.storage.set(bucket_key, str(rate))
-        await self.storage.set(last_update_key, str(int(time.time() * 1000)))
+        if self._packed_buckets:
+            self.storage.reset_bucket(bucket_key)
+        else:
+            await self.storage.set(bucket_key, self._encode_bucket_state(float(rate), now))
         
         return True
\ No newline at end of file
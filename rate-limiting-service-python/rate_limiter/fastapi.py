@@ -4,18 +4,57 @@ FastAPI integration for the rate limiter.
 
 from typing import Dict, Any, Optional, Callable, Union
 import functools
+import json
 
 from fastapi import Request, Response, Depends, HTTPException, status
-from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import Address, Headers
 
 from .limiter import RateLimiter, create_limiter
 from .utils import format_error_response
 
+_JSON_CONTENT_TYPE = (b'content-type', b'application/json')
 
-class RateLimiterMiddleware(BaseHTTPMiddleware):
+
+def _error_body_template(limit: int, interval: str) -> bytes:
+    """
+    Build the 429 response body with a %d placeholder for retry_after.
+    
+    Args:
+        limit: Rate limit
+        interval: Time interval
+        
+    Returns:
+        JSON body template
+    """
+    body = json.dumps(format_error_response(limit, interval, 0),
+                      ensure_ascii=False, separators=(',', ':'))
+    # retry_after is the last member, replace its value with the placeholder
+    head, _, _ = body.replace('%', '%%').rpartition(':')
+    return (head + ':%d}').encode('utf-8')
+
+
+class _ScopeRequest:
+    """
+    Minimal request view over an ASGI scope, enough for normalize_client_info.
+    """
+    
+    __slots__ = ('client', 'headers', 'path', 'user')
+    
+    def __init__(self, scope):
+        client = scope.get('client')
+        self.client = Address(*client) if client else None
+        self.headers = Headers(scope=scope)
+        self.path = scope.get('path', '/')
+        # Only present when an authentication middleware ran before us
+        self.user = scope.get('user')
+
+
+class RateLimiterMiddleware:
     """
     FastAPI middleware for rate limiting.
+    
+    Implemented as a pure ASGI middleware: unlike BaseHTTPMiddleware it does
+    not spawn a task and a memory stream per request.
     """
     
     def __init__(self, app, config_path: Optional[str] = None, 
@@ -24,52 +63,89 @@ class RateLimiterMiddleware(BaseHTTPMiddleware):
         Initialize the middleware.
         
         Args:
-            app: FastAPI application
+            app: ASGI application
             config_path: Path to configuration file
             options: Rate limiter options
         """
-        super().__init__(app)
+        self.app = app
         self.limiter = create_limiter(config_path, options)
+        
+        # 429 bodies only differ in retry_after, keep one template per limit;
+        # the limit header is constant per limit as well
+        self._429_templates = {}
+        self._limit_headers = {}
+        for opts in (self.limiter._default_opts, *self.limiter.options.get('endpoint_overrides', {}).values()):
+            rate = opts.get('rate', 60)
+            self._error_template(rate, opts.get('interval', 'minute'))
+            self._limit_headers[rate] = (b'x-ratelimit-limit', str(rate).encode())
     
-    async def dispatch(self, request: Request, call_next):
+    def _error_template(self, limit: int, interval: str) -> bytes:
         """
-        Process the request through rate limiting.
+        Get the cached 429 body template for a limit.
         
         Args:
-            request: FastAPI request
-            call_next: Next middleware
+            limit: Rate limit
+            interval: Time interval
             
         Returns:
-            Response
+            JSON body template
         """
-        # Check rate limit
-        result = await self.limiter.check(request)
+        template = self._429_templates.get((limit, interval))
+        if template is None:
+            template = self._429_templates[(limit, interval)] = _error_body_template(limit, interval)
+        return template
+    
+    async def __call__(self, scope, receive, send):
+        """
+        Process the request through rate limiting.
         
-        # Add rate limit headers to all responses
-        response = await call_next(request)
+        Args:
+            scope: ASGI connection scope
+            receive: ASGI receive channel
+            send: ASGI send channel
+        """
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+            
+        # Check rate limit
+        result = await self.limiter.check(_ScopeRequest(scope))
         
-        response.headers['X-RateLimit-Limit'] = str(result['limit'])
-        response.headers['X-RateLimit-Remaining'] = str(result['remaining'])
-        response.headers['X-RateLimit-Reset'] = str(result['reset'])
+        limit_header = self._limit_headers.get(result.limit)
+        if limit_header is None:
+            limit_header = self._limit_headers[result.limit] = (b'x-ratelimit-limit', str(result.limit).encode())
+            
+        rate_limit_headers = [
+            limit_header,
+            (b'x-ratelimit-remaining', str(result.remaining).encode()),
+            (b'x-ratelimit-reset', str(result.reset).encode()),
+        ]
         
-        if not result['allowed']:
-            # Rate limit exceeded
-            return JSONResponse(
-                content=format_error_response(
-                    result['limit'],
-                    'minute',  # TODO: Get from options
-                    result['reset']
-                ),
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                headers={
-                    'X-RateLimit-Limit': str(result['limit']),
-                    'X-RateLimit-Remaining': str(result['remaining']),
-                    'X-RateLimit-Reset': str(result['reset']),
-                    'Retry-After': str(result['retry_after'])
-                }
-            )
+        if not result.allowed:
+            # Rate limit exceeded, the application is never called
+            interval = self.limiter.resolve_options(scope.get('path', '/')).get('interval', 'minute')
+            body = self._error_template(result.limit, interval) % result.reset
+            
+            await send({
+                'type': 'http.response.start',
+                'status': status.HTTP_429_TOO_MANY_REQUESTS,
+                'headers': [
+                    _JSON_CONTENT_TYPE,
+                    (b'content-length', str(len(body)).encode()),
+                    *rate_limit_headers,
+                    (b'retry-after', str(result.retry_after).encode()),
+                ],
+            })
+            await send({'type': 'http.response.body', 'body': body})
+            return
         
-        return response
+        async def send_with_headers(message):
+            # Add rate limit headers to all responses
+            if message['type'] == 'http.response.start':
+                message['headers'] = [*message.get('headers', ()), *rate_limit_headers]
+            await send(message)
+            
+        await self.app(scope, receive, send_with_headers)
 
 
 def rate_limit(rate: Optional[int] = None, interval: Optional[str] = None,
@@ -97,20 +173,20 @@ def rate_limit(rate: Optional[int] = None, interval: Optional[str] = None,
     async def rate_limit_dependency(request: Request):
         result = await rate_limiter.check(request, options)
         
-        if not result['allowed']:
+        if not result.allowed:
             # Rate limit exceeded
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 detail=format_error_response(
-                    result['limit'],
+                    result.limit,
                     options.get('interval', 'minute'),
-                    result['reset']
+                    result.reset
                 ),
                 headers={
-                    'X-RateLimit-Limit': str(result['limit']),
-                    'X-RateLimit-Remaining': str(result['remaining']),
-                    'X-RateLimit-Reset': str(result['reset']),
-                    'Retry-After': str(result['retry_after'])
+                    'X-RateLimit-Limit': str(result.limit),
+                    'X-RateLimit-Remaining': str(result.remaining),
+                    'X-RateLimit-Reset': str(result.reset),
+                    'Retry-After': str(result.retry_after)
                 }
             )
     
@@ -2,19 +2,24 @@
 Main rate limiter implementation.
 """
 
-from typing import Dict, Any, Optional, Union, Callable
+from typing import Dict, Any, Optional, Union, Callable, List, Tuple
+import asyncio
 import inspect
 import functools
+import threading
 import json
 import os
 
 from .algorithms import TokenBucket, SlidingWindow
-from .storage import RedisStorage, MemoryStorage
+from .storage import RedisStorage, MemoryStorage, AtomicMemoryStorage
+from .types import RateLimitResult
 from .utils import (
     normalize_client_info,
     normalize_config,
     format_error_response,
-    load_config_from_file
+    load_config_from_file,
+    is_path_pattern,
+    compile_path_patterns
 )
 
 
@@ -37,6 +42,10 @@ class RateLimiter:
             'requests_total': 0,
             'throttled_total': 0
         }
+        
+        # Event loop serving checks from synchronous code, started on first use
+        self._bg_loop = None
+        self._bg_loop_lock = threading.Lock()
     
     def _setup_storage(self):
         """
@@ -47,6 +56,8 @@ class RateLimiter:
         
         if storage_type == 'redis':
             self.storage = RedisStorage(storage_options)
+        elif storage_type == 'atomic_memory':
+            self.storage = AtomicMemoryStorage(storage_options)
         else:
             # Default to in-memory storage
             self.storage = MemoryStorage(storage_options)
@@ -60,8 +71,83 @@ class RateLimiter:
             'sliding_window': SlidingWindow(self.storage, self.options)
         }
         
-        # Default algorithm
+        # Default algorithm, bound once: changing self.algorithm afterwards
+        # has no effect on check() or check_batch(), build a new limiter instead
         self.algorithm = self.options.get('algorithm', 'token_bucket')
+        algorithm = self._algorithm = self.algorithms.get(self.algorithm, self.algorithms['token_bucket'])
+        self._check_fn = algorithm.check
+        # In-process storages are checked from synchronous code directly, see check_sync
+        self._check_sync_fn = algorithm.check_sync if getattr(self.storage, 'supports_sync', False) else None
+        
+        # Exact paths are resolved with a dict lookup, patterns such as
+        # '/api/users/{id}' or '/api/admin/*' with one precompiled expression
+        endpoint_overrides = self.options.get('endpoint_overrides', {})
+        self._override_paths = {
+            path: opts for path, opts in endpoint_overrides.items()
+            if not is_path_pattern(path)
+        }
+        patterns = [path for path in endpoint_overrides if is_path_pattern(path)]
+        self._override_matcher = compile_path_patterns(patterns)
+        self._override_values = [endpoint_overrides[path] for path in patterns]
+        
+        # Limits for requests without an override or explicit options
+        self._default_opts = self.options.get('default_limits', {}).get('anonymous', self.options)
+    
+    def _match_pattern(self, path: str) -> Optional[Dict[str, Any]]:
+        """
+        Find the endpoint override whose path pattern matches a request path.
+        
+        Args:
+            path: Request path
+            
+        Returns:
+            Override options or None if no pattern matches
+        """
+        if self._override_matcher is None:
+            return None
+        match = self._override_matcher.fullmatch(path)
+        if match:
+            return self._override_values[match.lastindex - 1]
+        return None
+    
+    def resolve_options(self, path: str, options: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Get the limit options that apply to a request path.
+        
+        Args:
+            path: Request path
+            options: Options passed to check, used when no override matches
+            
+        Returns:
+            Endpoint override, explicit options or default limits
+        """
+        effective_options = self._override_paths.get(path)
+        if effective_options is None:
+            effective_options = self._match_pattern(path) or options or self._default_opts
+        return effective_options
+    
+    def _run_sync(self, coro):
+        """
+        Run a coroutine to completion from synchronous code.
+        
+        All synchronous callers share one event loop running forever in a
+        daemon thread, instead of creating or switching loops per request.
+        
+        Args:
+            coro: Coroutine to run
+            
+        Returns:
+            Coroutine result
+        """
+        if self._bg_loop is None:
+            with self._bg_loop_lock:
+                if self._bg_loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name='rate-limiter-loop',
+                                     daemon=True).start()
+                    self._bg_loop = loop
+                    
+        return asyncio.run_coroutine_threadsafe(coro, self._bg_loop).result()
     
     def get_client_identifier(self, request) -> str:
         """
@@ -73,8 +159,18 @@ class RateLimiter:
         Returns:
             Client identifier string
         """
-        client_info = normalize_client_info(request)
+        return self._id_from_info(normalize_client_info(request))
+    
+    def _id_from_info(self, client_info: Dict[str, Any]) -> str:
+        """
+        Get client identifier from already normalized client info.
         
+        Args:
+            client_info: Result of normalize_client_info
+            
+        Returns:
+            Client identifier string
+        """
         # Check for user ID in authenticated requests
         user_id = client_info.get('user_id')
         if user_id and self.options.get('client_identifier') == 'user_id':
@@ -89,7 +185,7 @@ class RateLimiter:
         ip = client_info.get('ip', 'unknown')
         return f"ip:{ip}"
     
-    async def check(self, request, options: Dict[str, Any] = None) -> Dict[str, Any]:
+    async def check(self, request, options: Dict[str, Any] = None) -> RateLimitResult:
         """
         Check if a request is allowed based on rate limits.
         
@@ -102,30 +198,92 @@ class RateLimiter:
         """
         self.metrics['requests_total'] += 1
         
-        # Get client identifier
-        identifier = self.get_client_identifier(request)
-        
-        # Get request path
+        # Parse the request once for both identifier and path
         client_info = normalize_client_info(request)
+        identifier = self._id_from_info(client_info)
         path = client_info.get('path', '/')
         
-        # Check for endpoint-specific override
-        endpoint_overrides = self.options.get('endpoint_overrides', {})
-        effective_options = endpoint_overrides.get(path, options or self.options)
+        # Perform check with the configured algorithm (token bucket by default)
+        result = await self._check_fn(identifier, self.resolve_options(path, options))
         
-        # Select algorithm and perform check
-        result = None
-        if self.algorithm == 'sliding_window':
-            result = await self.algorithms['sliding_window'].check(identifier, effective_options)
-        else:
-            # Default to token bucket
-            result = await self.algorithms['token_bucket'].check(identifier, effective_options)
-        
-        if not result['allowed']:
+        if not result.allowed:
             self.metrics['throttled_total'] += 1
         
         return result
     
+    def check_sync(self, request, options: Dict[str, Any] = None) -> RateLimitResult:
+        """
+        Check a request from synchronous code (sync view functions, Flask).
+        
+        With in-memory storage the check runs in the calling thread without an
+        event loop; otherwise check() runs on the background loop.
+        
+        Args:
+            request: HTTP request object
+            options: Optional rate limit options
+            
+        Returns:
+            Rate limit check result
+        """
+        if self._check_sync_fn is None:
+            return self._run_sync(self.check(request, options))
+            
+        self.metrics['requests_total'] += 1
+        
+        client_info = normalize_client_info(request)
+        identifier = self._id_from_info(client_info)
+        path = client_info.get('path', '/')
+        
+        result = self._check_sync_fn(identifier, self.resolve_options(path, options))
+        
+        if not result.allowed:
+            self.metrics['throttled_total'] += 1
+            
+        return result
+    
+    async def check_batch(self, request, specs: List[Tuple[str, Dict[str, Any]]]) -> List[RateLimitResult]:
+        """
+        Check a request against several limits at once, e.g. per IP, per user
+        and global limits on a login endpoint.
+        
+        With the token bucket algorithm all buckets are updated in a single
+        storage round trip.
+        
+        Args:
+            request: HTTP request object
+            specs: List of (scope, options) pairs; scope is 'ip', 'user',
+                'client' (the identifier check() would use), 'global' or any
+                other string used as the identifier as is
+                
+        Returns:
+            Rate limit check results in spec order
+        """
+        self.metrics['requests_total'] += 1
+        
+        client_info = normalize_client_info(request)
+        scopes = {
+            'ip': f"ip:{client_info.get('ip', 'unknown')}",
+            'global': 'global',
+            'client': self._id_from_info(client_info),
+        }
+        user_id = client_info.get('user_id')
+        # Anonymous requests get a per-client user bucket, separate from the 'ip' one
+        scopes['user'] = f"user:{user_id or scopes['client']}"
+        
+        identifiers = [scopes.get(scope, scope) for scope, _ in specs]
+        options = [opts for _, opts in specs]
+        
+        algorithm = self._algorithm
+        if hasattr(algorithm, 'check_many'):
+            results = await algorithm.check_many(identifiers, options)
+        else:
+            results = [await algorithm.check(identifier, opts) for identifier, opts in zip(identifiers, options)]
+            
+        if not all(result.allowed for result in results):
+            self.metrics['throttled_total'] += 1
+            
+        return results
+    
     async def reset(self, identifier: str, options: Dict[str, Any] = None) -> bool:
         """
         Reset rate limit for a client.
@@ -160,119 +318,121 @@ class RateLimiter:
         def decorator(func_or_endpoint):
             if callable(func_or_endpoint):
                 # Function decorator
-                @functools.wraps(func_or_endpoint)
-                async def wrapper(*args, **kwargs):
-                    # Find request object in args or kwargs
-                    request = None
+                req_param, req_pos = _find_request_param(func_or_endpoint)
+                
+                def find_request(args, kwargs):
+                    # Request parameter resolved from the signature at decoration time
+                    if req_param is not None:
+                        if req_pos is not None and req_pos < len(args):
+                            return args[req_pos]
+                        return kwargs.get(req_param)
+                        
+                    # Otherwise find request object in args or kwargs
                     for arg in args:
                         if hasattr(arg, 'headers') or hasattr(arg, 'cookies'):
-                            request = arg
+                            return arg
+                            
+                    for arg_name, arg_value in kwargs.items():
+                        if arg_name in ('request', 'req') or \
+                           hasattr(arg_value, 'headers') or \
+                           hasattr(arg_value, 'cookies'):
+                            return arg_value
+                            
+                    return None
+                
+                def rejected(args, result):
+                    # Rate limit exceeded
+                    # Handle different web frameworks
+                    response_func = None
+                    for arg in args:
+                        if hasattr(arg, 'json') and callable(arg.json):
+                            response_func = arg.json
                             break
+                            
+                    if response_func:
+                        # Return JSON response
+                        return response_func(
+                            format_error_response(
+                                result.limit,
+                                options.get('interval', 'minute'),
+                                result.reset
+                            ),
+                            status_code=429,
+                            headers={
+                                'X-RateLimit-Limit': str(result.limit),
+                                'X-RateLimit-Remaining': str(result.remaining),
+                                'X-RateLimit-Reset': str(result.reset),
+                                'Retry-After': str(result.retry_after)
+                            }
+                        )
+                        
+                    # If we can't find a way to return a response, raise an exception
+                    error_msg = f"Rate limit exceeded: {result.limit} requests per {options.get('interval', 'minute')}"
+                    raise RateLimitExceeded(error_msg, result)
                     
-                    if not request:
-                        for arg_name, arg_value in kwargs.items():
-                            if arg_name in ('request', 'req') or \
-                               hasattr(arg_value, 'headers') or \
-                               hasattr(arg_value, 'cookies'):
-                                request = arg_value
-                                break
-                    
+                # Handle both async and sync functions
+                if not inspect.iscoroutinefunction(func_or_endpoint):
+                    # Sync functions stay in the calling thread, see check_sync
+                    @functools.wraps(func_or_endpoint)
+                    def sync_wrapper(*args, **kwargs):
+                        request = find_request(args, kwargs)
+                        if not request:
+                            # Can't find request object, skip rate limiting
+                            return func_or_endpoint(*args, **kwargs)
+                            
+                        result = self.check_sync(request, options)
+                        if not result.allowed:
+                            return rejected(args, result)
+                            
+                        return func_or_endpoint(*args, **kwargs)
+                        
+                    return sync_wrapper
+                
+                @functools.wraps(func_or_endpoint)
+                async def wrapper(*args, **kwargs):
+                    request = find_request(args, kwargs)
                     if not request:
                         # Can't find request object, skip rate limiting
                         return await func_or_endpoint(*args, **kwargs)
                     
                     # Check rate limit
                     result = await self.check(request, options)
-                    
-                    if not result['allowed']:
-                        # Rate limit exceeded
-                        # Handle different web frameworks
-                        response_func = None
-                        for arg in args:
-                            if hasattr(arg, 'json') and callable(arg.json):
-                                response_func = arg.json
-                                break
-                        
-                        if response_func:
-                            # Return JSON response
-                            return response_func(
-                                format_error_response(
-                                    result['limit'],
-                                    options.get('interval', 'minute'),
-                                    result['reset']
-                                ),
-                                status_code=429,
-                                headers={
-                                    'X-RateLimit-Limit': str(result['limit']),
-                                    'X-RateLimit-Remaining': str(result['remaining']),
-                                    'X-RateLimit-Reset': str(result['reset']),
-                                    'Retry-After': str(result['retry_after'])
-                                }
-                            )
-                        
-                        # If we can't find a way to return a response, raise an exception
-                        error_msg = f"Rate limit exceeded: {result['limit']} requests per {options.get('interval', 'minute')}"
-                        raise RateLimitExceeded(error_msg, result)
+                    if not result.allowed:
+                        return rejected(args, result)
                     
                     # Rate limit not exceeded, proceed to original function
                     return await func_or_endpoint(*args, **kwargs)
                 
-                # Handle both async and sync functions
-                if not inspect.iscoroutinefunction(func_or_endpoint):
-                    # For sync functions
-                    @functools.wraps(func_or_endpoint)
-                    def sync_wrapper(*args, **kwargs):
-                        import asyncio
-                        try:
-                            loop = asyncio.get_event_loop()
-                        except RuntimeError:
-                            loop = asyncio.new_event_loop()
-                            asyncio.set_event_loop(loop)
-                        
-                        return loop.run_until_complete(wrapper(*args, **kwargs))
-                    
-                    return sync_wrapper
-                
                 return wrapper
             else:
-                # Framework-specific middleware (e.g., for Flask)
-                async def middleware():
+                # Framework-specific middleware (e.g., for Flask before_request)
+                def flask_middleware():
                     from flask import request, jsonify, make_response
                     
-                    # Check rate limit
-                    result = await self.check(request, options)
+                    # The request proxy is resolved here since it is bound to
+                    # this thread, check_sync may hand it to the background loop
+                    result = self.check_sync(request._get_current_object(), options)
                     
-                    if not result['allowed']:
+                    if not result.allowed:
                         # Rate limit exceeded
                         response = make_response(jsonify(
                             format_error_response(
-                                result['limit'],
+                                result.limit,
                                 options.get('interval', 'minute'),
-                                result['reset']
+                                result.reset
                             )
                         ), 429)
                         
-                        response.headers['X-RateLimit-Limit'] = str(result['limit'])
-                        response.headers['X-RateLimit-Remaining'] = str(result['remaining'])
-                        response.headers['X-RateLimit-Reset'] = str(result['reset'])
-                        response.headers['Retry-After'] = str(result['retry_after'])
+                        response.headers['X-RateLimit-Limit'] = str(result.limit)
+                        response.headers['X-RateLimit-Remaining'] = str(result.remaining)
+                        response.headers['X-RateLimit-Reset'] = str(result.reset)
+                        response.headers['Retry-After'] = str(result.retry_after)
                         
                         return response
                     
                     # Rate limit not exceeded, continue to next middleware/handler
                     return None
                 
-                # For Flask before_request
-                def flask_middleware():
-                    import asyncio
-                    try:
-                        loop = asyncio.get_event_loop()
-                    except RuntimeError:
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
-                    
-                    return loop.run_until_complete(middleware())
-                
                 return flask_middleware
         
         return decorator
@@ -287,12 +447,42 @@ class RateLimiter:
         return dict(self.metrics)
 
 
+def _find_request_param(func: Callable):
+    """
+    Locate the request parameter in a function signature.
+    
+    A parameter counts as the request if it is annotated with a class named
+    'Request' (FastAPI, Starlette, Flask, ...) or is named 'request' or 'req'.
+    
+    Args:
+        func: Decorated function
+        
+    Returns:
+        Tuple of (parameter name, positional index); (None, None) if not found,
+        the index is None for keyword-only parameters
+    """
+    try:
+        parameters = list(inspect.signature(func).parameters.values())
+    except (TypeError, ValueError):
+        return None, None
+        
+    for index, param in enumerate(parameters):
+        annotation = param.annotation
+        annotation_name = annotation if isinstance(annotation, str) else getattr(annotation, '__name__', None)
+        if annotation_name == 'Request' or param.name in ('request', 'req'):
+            if param.kind in (param.POSITIONAL_ONLY, param.POSITIONAL_OR_KEYWORD):
+                return param.name, index
+            return param.name, None
+            
+    return None, None
+
+
 class RateLimitExceeded(Exception):
     """
     Exception raised when rate limit is exceeded.
     """
     
-    def __init__(self, message: str, result: Dict[str, Any]):
+    def __init__(self, message: str, result: RateLimitResult):
         super().__init__(message)
         self.result = result
 
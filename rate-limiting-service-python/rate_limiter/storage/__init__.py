@@ -4,5 +4,6 @@ Storage adapters for rate limiting.
 
 from .redis_storage import RedisStorage
 from .memory_storage import MemoryStorage
+from .atomic_memory import AtomicMemoryStorage
 
-__all__ = ['RedisStorage', 'MemoryStorage'] 
\ No newline at end of file
+__all__ = ['RedisStorage', 'MemoryStorage', 'AtomicMemoryStorage'] 
\ No newline at end of file
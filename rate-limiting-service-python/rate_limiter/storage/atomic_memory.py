@@ -0,0 +1,241 @@
+"""
+Packed token bucket storage for rate limiting, optionally shared between processes.
+"""
+
+from typing import Dict, Any, Optional, Tuple
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+import time
+
+try:
+    from multiprocessing import resource_tracker
+    from multiprocessing.shared_memory import SharedMemory
+except ImportError:  # Python 3.7
+    SharedMemory = None
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from .._kernels import tb_consume
+from .memory_storage import MemoryStorage
+
+# Slot layout: 64-bit key fingerprint, float32 tokens, last update time in
+# Unix milliseconds (64 bits, so idle buckets never wrap around)
+_SLOT = struct.Struct('<QfQ')
+
+# A bucket may live in any of this many consecutive slots from its home slot
+_PROBE = 4
+
+
+class AtomicMemoryStorage(MemoryStorage):
+    """
+    In-memory storage with a fixed-size table of packed token buckets.
+    
+    A token bucket check is a single read and write of one table slot instead
+    of several dict operations through get/set. With the 'name' option the
+    table lives in named shared memory, so all worker processes created with
+    the same name and slot count share their buckets; updates are then
+    serialized per slot with POSIX byte-range locks. Byte-range locks are
+    held per process, threads of one process are serialized by sync_lock.
+    
+    A bucket takes the first free slot of a short run of slots starting at its
+    home slot. When the whole run is taken, it replaces the least recently
+    used bucket there and inherits its tokens, so a collision never hands out
+    a full bucket. Other keys (e.g. sliding window counters) are kept by
+    MemoryStorage as usual.
+    """
+    
+    # TokenBucket uses consume_token instead of get/set
+    supports_buckets = True
+    
+    def __init__(self, options: Dict[str, Any] = None):
+        """
+        Initialize packed bucket storage.
+        
+        Args:
+            options: Storage options:
+                slots: Number of bucket slots (default 65536, 20 bytes each)
+                name: Shared memory name to share buckets between processes
+        """
+        super().__init__(options)
+        self._slots = int(self.options.get('slots', 65536))
+        self._probe = min(_PROBE, self._slots)
+        self._shm = None
+        self._lock_fd = None
+        
+        size = self._slots * _SLOT.size
+        name = self.options.get('name')
+        
+        if not name:
+            self._buf = memoryview(bytearray(size))
+            return
+            
+        if SharedMemory is None or fcntl is None:
+            raise RuntimeError("Shared bucket tables require Python 3.8+ and POSIX file locks")
+            
+        # The segment outlives any single worker, so no worker's resource
+        # tracker may remove it on exit, see unlink()
+        untracked = {'track': False} if sys.version_info >= (3, 13) else {}
+        try:
+            self._shm = SharedMemory(name=name, create=True, size=size, **untracked)
+        except FileExistsError:
+            self._shm = SharedMemory(name=name, **untracked)
+            if self._shm.size < size:
+                self._shm.close()
+                raise ValueError(f"Shared bucket table '{name}' is smaller than {self._slots} slots")
+                
+        if not untracked:
+            resource_tracker.unregister(self._shm._name, 'shared_memory')
+            
+        self._buf = self._shm.buf
+        lock_path = os.path.join(tempfile.gettempdir(), f"{name}.lock")
+        self._lock_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+    
+    def _slot(self, key: bytes) -> Tuple[int, int]:
+        """
+        Map a key to the first slot of its probe run.
+        
+        Runs do not wrap around the end of the table, so a run is one
+        contiguous byte range that a single lock covers.
+        
+        Args:
+            key: Bucket key
+            
+        Returns:
+            Tuple of (fingerprint, byte offset of the home slot)
+        """
+        if isinstance(key, str):
+            key = key.encode()
+        # Stable across processes, unlike hash(); 0 marks an empty slot
+        fingerprint = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little') or 1
+        return fingerprint, (fingerprint % (self._slots - self._probe + 1)) * _SLOT.size
+    
+    def _find(self, fingerprint: int, home: int, now: int) -> Tuple[int, Optional[Tuple[int, float, int]]]:
+        """
+        Find the slot of a bucket within its probe run.
+        
+        Args:
+            fingerprint: Bucket key fingerprint
+            home: Byte offset of the home slot
+            now: Current time in milliseconds
+            
+        Returns:
+            Tuple of (slot offset, slot contents); contents are None for a
+            free slot and those of the replaced bucket for a full run
+        """
+        free = None
+        oldest = oldest_slot = None
+        oldest_age = -1
+        for offset in range(home, home + self._probe * _SLOT.size, _SLOT.size):
+            slot = _SLOT.unpack_from(self._buf, offset)
+            if slot[0] == fingerprint:
+                return offset, slot
+            if slot[0] == 0:
+                if free is None:
+                    free = offset
+                continue
+            age = now - slot[2]
+            if age > oldest_age:
+                oldest, oldest_age, oldest_slot = offset, age, slot
+                
+        if free is not None:
+            return free, None
+        return oldest, oldest_slot
+    
+    def consume_token(self, key: bytes, rate: int, refill_rate: float) -> Tuple[bool, float]:
+        """
+        Refill a bucket and take one token from it if available.
+        
+        The clock is read under the slot locks, so no update stored by
+        another thread or process is newer than this one's time.
+        
+        Args:
+            key: Bucket key
+            rate: Bucket capacity
+            refill_rate: Tokens added per second
+            
+        Returns:
+            Tuple of (allowed, tokens left)
+        """
+        fingerprint, home = self._slot(key)
+        run = self._probe * _SLOT.size
+        
+        self.sync_lock.acquire()
+        if self._lock_fd is not None:
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_EX, run, home)
+        try:
+            now = time.time_ns() // 1_000_000
+            offset, slot = self._find(fingerprint, home, now)
+            
+            if slot is None:
+                tokens, elapsed_ms = float(rate), 0
+            else:
+                # Own bucket, or the replaced one's tokens: a bucket pushed out
+                # by a collision was never fuller than that
+                _, tokens, last_update = slot
+                elapsed_ms = now - last_update
+                
+            allowed, tokens = tb_consume(tokens, elapsed_ms, rate, refill_rate)
+            
+            _SLOT.pack_into(self._buf, offset, fingerprint, tokens, now)
+        finally:
+            if self._lock_fd is not None:
+                fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, run, home)
+            self.sync_lock.release()
+                
+        return allowed, tokens
+    
+    def reset_bucket(self, key: bytes) -> bool:
+        """
+        Reset a bucket to full capacity.
+        
+        Args:
+            key: Bucket key
+            
+        Returns:
+            Success indicator
+        """
+        fingerprint, home = self._slot(key)
+        run = self._probe * _SLOT.size
+        
+        self.sync_lock.acquire()
+        if self._lock_fd is not None:
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_EX, run, home)
+        try:
+            for offset in range(home, home + run, _SLOT.size):
+                if _SLOT.unpack_from(self._buf, offset)[0] == fingerprint:
+                    _SLOT.pack_into(self._buf, offset, 0, 0.0, 0)
+        finally:
+            if self._lock_fd is not None:
+                fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, run, home)
+            self.sync_lock.release()
+                
+        return True
+    
+    def unlink(self):
+        """
+        Destroy the shared bucket table (call once, when all workers are done).
+        """
+        if self._shm is not None:
+            if sys.version_info < (3, 13):
+                # Before 3.13 unlink() always unregisters the segment, which
+                # __init__ already did
+                resource_tracker.register(self._shm._name, 'shared_memory')
+            self._shm.unlink()
+    
+    async def close(self):
+        """
+        Detach from the shared bucket table.
+        """
+        if self._shm is not None:
+            self._buf = None
+            self._shm.close()
+            self._shm = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
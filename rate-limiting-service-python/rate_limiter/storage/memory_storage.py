@@ -2,17 +2,41 @@
 In-memory storage adapter for rate limiting.
 """
 
-from typing import Dict, Any, Optional, Union
+from typing import Dict, Any, Optional, Union, List
+import heapq
+import itertools
+import threading
 import time
-import asyncio
 from collections import defaultdict
 
 
+# Maximum number of expired keys removed per storage operation
+_SWEEP_LIMIT = 20
+
+
+def _to_str(value: Any) -> Optional[str]:
+    # Values as RedisStorage returns them
+    if value is None or value.__class__ is str:
+        return value
+    if value.__class__ is tuple:
+        return '|'.join(map(str, value))
+    return str(value)
+
+
 class MemoryStorage:
     """
     In-memory storage adapter for rate limiting.
     """
     
+    # Algorithms fall back to in-process logic, see execute_lua
+    supports_lua = False
+    # Values are kept as given, so algorithms may store tuples directly and
+    # read them back with _get_native; get() returns str like RedisStorage
+    stores_objects = True
+    # No I/O, algorithms may call the *_sync methods without awaiting;
+    # they hold sync_lock around a read-modify-write
+    supports_sync = True
+    
     def __init__(self, options: Dict[str, Any] = None):
         """
         Initialize memory storage adapter.
@@ -22,37 +46,81 @@ class MemoryStorage:
         """
         self.options = options or {}
         self._data = {}
+        # Expiration times are whole seconds of the monotonic clock, so a
+        # wall-clock jump cannot expire keys early or keep them alive. A key
+        # lives until its expiration second has passed.
         self._expirations = {}  # Map of key to expiration time
+        # Counters written by incr_with_expire, key to (count, expiration time);
+        # one probe and one tuple store per increment
+        self._counters = {}
+        
+        # Min-heap of (expires_at, seq, key), at most about one entry per key:
+        # a later expiration does not add an entry, the existing one is
+        # rescheduled when it comes due. Reads and writes sweep due entries,
+        # there is no background task.
+        self._exp_heap = []
+        # Breaks expiration ties so keys are never compared (str and bytes
+        # keys may share the heap)
+        self._exp_seq = itertools.count()
         
-        # Start background task to clean expired keys
-        self._setup_expiration_cleaner()
+        # Synchronous checks run in the calling thread, e.g. several WSGI
+        # worker threads at once, so a check's read and write must not
+        # interleave with another thread's
+        self.sync_lock = threading.Lock()
     
-    def _setup_expiration_cleaner(self):
+    def _sweep(self, now: int):
         """
-        Set up background task to clean expired keys.
+        Remove keys whose expiration is due, oldest first.
+        
+        Args:
+            now: Current monotonic time in seconds
         """
-        async def clean_expired_keys():
-            while True:
-                now = time.time()
-                # Find expired keys
-                expired_keys = [key for key, expires_at in self._expirations.items() 
-                                if expires_at <= now]
-                
-                # Remove expired keys
-                for key in expired_keys:
-                    del self._data[key]
-                    del self._expirations[key]
-                
-                # Sleep for 1 second
-                await asyncio.sleep(1)
+        heap = self._exp_heap
+        # Bounded so a burst of expirations does not stall a single request
+        for _ in range(_SWEEP_LIMIT):
+            if not heap or heap[0][0] >= now:
+                return
+            expires_at, _, key = heapq.heappop(heap)
+            current = self._expirations.get(key)
+            if current is None:
+                entry = self._counters.get(key)
+                if entry is None:
+                    # Deleted or made persistent
+                    continue
+                current = entry[1]
+                if current < now:
+                    del self._counters[key]
+                    continue
+            elif current < now:
+                self._data.pop(key, None)
+                del self._expirations[key]
+                continue
+            if current > expires_at:
+                # Extended since this entry was pushed
+                self._schedule(key, current)
+    
+    def _schedule(self, key: Union[str, bytes], expires_at: int):
+        """
+        Add a key to the expiration heap.
+        
+        Args:
+            key: Storage key
+            expires_at: Expiration time in monotonic seconds
+        """
+        heapq.heappush(self._exp_heap, (expires_at, next(self._exp_seq), key))
+    
+    def _set_expiration(self, key: str, expires_at: int):
+        """
+        Set a key's expiration time and schedule it for sweeping.
         
-        # Schedule the background task
-        try:
-            loop = asyncio.get_event_loop()
-            loop.create_task(clean_expired_keys())
-        except RuntimeError:
-            # Handle case when there's no event loop
-            pass
+        Args:
+            key: Storage key
+            expires_at: Expiration time in monotonic seconds
+        """
+        previous = self._expirations.get(key)
+        self._expirations[key] = expires_at
+        if previous is None or expires_at < previous:
+            self._schedule(key, expires_at)
     
     async def get(self, key: str) -> Optional[str]:
         """
@@ -64,14 +132,51 @@ class MemoryStorage:
         Returns:
             Value or None if not found
         """
+        return self.get_sync(key)
+    
+    def get_sync(self, key: str) -> Optional[str]:
+        """
+        Get a value from memory without awaiting.
+        
+        Counters are returned as str like with Redis; tuples stored by the
+        algorithms (stores_objects) are joined with '|'.
+        
+        Args:
+            key: Storage key
+            
+        Returns:
+            Value or None if not found
+        """
+        return _to_str(self._get_native(key))
+    
+    def _get_native(self, key: str) -> Any:
+        """
+        Get a value as stored, e.g. int counters and algorithm state tuples.
+        
+        Args:
+            key: Storage key
+            
+        Returns:
+            Value or None if not found
+        """
+        now = int(time.monotonic())
+        self._sweep(now)
+        
         # Check if key exists and is not expired
         if key in self._data:
-            if key in self._expirations and self._expirations[key] <= time.time():
+            if key in self._expirations and self._expirations[key] < now:
                 # Key is expired
                 del self._data[key]
                 del self._expirations[key]
                 return None
             return self._data[key]
+            
+        entry = self._counters.get(key)
+        if entry is not None:
+            if entry[1] < now:
+                del self._counters[key]
+                return None
+            return entry[0]
         return None
     
     async def set(self, key: str, value: str, ttl: Optional[int] = None) -> bool:
@@ -86,10 +191,28 @@ class MemoryStorage:
         Returns:
             Success indicator
         """
+        return self.set_sync(key, value, ttl)
+    
+    def set_sync(self, key: str, value: str, ttl: Optional[int] = None) -> bool:
+        """
+        Set a value in memory with optional expiration without awaiting.
+        
+        Args:
+            key: Storage key
+            value: Value to store
+            ttl: Time-to-live in seconds
+            
+        Returns:
+            Success indicator
+        """
+        now = int(time.monotonic())
+        self._sweep(now)
         self._data[key] = value
+        # Replaces a counter written by incr_with_expire
+        self._counters.pop(key, None)
         
         if ttl:
-            self._expirations[key] = time.time() + ttl
+            self._set_expiration(key, now + ttl)
         elif key in self._expirations:
             # Remove expiration if ttl is None
             del self._expirations[key]
@@ -106,20 +229,123 @@ class MemoryStorage:
         Returns:
             New counter value
         """
-        # Check if key exists
-        value = await self.get(key)
-        if value is None:
-            value = "0"
-        
-        try:
-            # Try to convert to int and increment
-            new_value = int(value) + 1
-            await self.set(key, str(new_value))
-            return new_value
-        except (ValueError, TypeError):
-            # If value is not an integer, set to 1
-            await self.set(key, "1")
-            return 1
+        return self.incr_sync(key)
+    
+    def incr_sync(self, key: str) -> int:
+        """
+        Increment a counter in memory without awaiting.
+        
+        Args:
+            key: Storage key
+            
+        Returns:
+            New counter value
+        """
+        # Counters are stored as int; like Redis INCR, an existing TTL is kept
+        now = int(time.monotonic())
+        self._sweep(now)
+        
+        expires_at = self._expirations.get(key)
+        if expires_at is not None and expires_at < now:
+            # Key is expired
+            self._data.pop(key, None)
+            del self._expirations[key]
+            value = 0
+        elif key in self._data:
+            value = self._data[key]
+        else:
+            entry = self._counters.get(key)
+            if entry is not None and entry[1] >= now:
+                # Counter written by incr_with_expire, keeps its expiration
+                count = entry[0] + 1
+                self._counters[key] = (count, entry[1])
+                return count
+            value = 0
+            
+        if value.__class__ is not int:
+            try:
+                value = int(value)
+            except (ValueError, TypeError):
+                # If value is not an integer, start over
+                value = 0
+                
+        value += 1
+        self._data[key] = value
+        return value
+    
+    async def incr_with_expire(self, key: str, ttl: int) -> int:
+        """
+        Increment a counter and set its expiration.
+        
+        Args:
+            key: Storage key
+            ttl: Time-to-live in seconds
+            
+        Returns:
+            New counter value
+        """
+        return self.incr_with_expire_sync(key, ttl)
+    
+    def incr_with_expire_sync(self, key: str, ttl: int) -> int:
+        """
+        Increment a counter and set its expiration without awaiting.
+        
+        Args:
+            key: Storage key
+            ttl: Time-to-live in seconds
+            
+        Returns:
+            New counter value
+        """
+        now = int(time.monotonic())
+        self._sweep(now)
+        
+        if key in self._data:
+            # Continue from a value written with set()
+            try:
+                count = int(self._get_native(key) or 0) + 1
+            except (ValueError, TypeError):
+                # If value is not an integer, start over
+                count = 1
+            self.delete_sync(key)
+            self._schedule(key, now + ttl)
+        else:
+            entry = self._counters.get(key)
+            if entry is None or entry[1] < now:
+                count = 1
+                self._schedule(key, now + ttl)
+            else:
+                # The heap entry of a live counter is rescheduled by _sweep
+                count = entry[0] + 1
+                
+        self._counters[key] = (count, now + ttl)
+        return count
+    
+    async def incr_many(self, keys: List[str], ttl: int) -> List[int]:
+        """
+        Increment several counters and set their expiration.
+        
+        Args:
+            keys: Storage keys
+            ttl: Time-to-live in seconds, applied to every key
+            
+        Returns:
+            New counter values in key order
+        """
+        return self.incr_many_sync(keys, ttl)
+    
+    def incr_many_sync(self, keys: List[str], ttl: int) -> List[int]:
+        """
+        Increment several counters and set their expiration without awaiting.
+        
+        Args:
+            keys: Storage keys
+            ttl: Time-to-live in seconds, applied to every key
+            
+        Returns:
+            New counter values in key order
+        """
+        return [self.incr_with_expire_sync(key, ttl) for key in keys]
     
     async def expire(self, key: str, ttl: int) -> int:
         """
@@ -132,11 +358,96 @@ class MemoryStorage:
         Returns:
             1 if the timeout was set, 0 if key doesn't exist
         """
+        return self.expire_sync(key, ttl)
+    
+    def expire_sync(self, key: str, ttl: int) -> int:
+        """
+        Set expiration time on a key without awaiting.
+        
+        Args:
+            key: Storage key
+            ttl: Time-to-live in seconds
+            
+        Returns:
+            1 if the timeout was set, 0 if key doesn't exist
+        """
+        now = int(time.monotonic())
         if key in self._data:
-            self._expirations[key] = time.time() + ttl
+            self._set_expiration(key, now + ttl)
+            return 1
+        entry = self._counters.get(key)
+        if entry is not None:
+            expires_at = now + ttl
+            self._counters[key] = (entry[0], expires_at)
+            if expires_at < entry[1]:
+                self._schedule(key, expires_at)
             return 1
         return 0
     
+    async def mget(self, keys: List[str]) -> List[Optional[str]]:
+        """
+        Get several values from memory.
+        
+        Args:
+            keys: Storage keys
+            
+        Returns:
+            Values in key order, None for missing keys
+        """
+        return self.mget_sync(keys)
+    
+    def mget_sync(self, keys: List[str]) -> List[Optional[str]]:
+        """
+        Get several values from memory without awaiting.
+        
+        Args:
+            keys: Storage keys
+            
+        Returns:
+            Values in key order, None for missing keys
+        """
+        return [_to_str(self._get_native(key)) for key in keys]
+    
+    def _mget_native(self, keys: List[str]) -> List[Any]:
+        """
+        Get several values as stored, see _get_native.
+        
+        Args:
+            keys: Storage keys
+            
+        Returns:
+            Values in key order, None for missing keys
+        """
+        return [self._get_native(key) for key in keys]
+    
+    async def mset(self, mapping: Dict[str, str], ttl: Optional[int] = None) -> bool:
+        """
+        Set several values in memory with optional expiration.
+        
+        Args:
+            mapping: Map of storage key to value
+            ttl: Time-to-live in seconds, applied to every key
+            
+        Returns:
+            Success indicator
+        """
+        return self.mset_sync(mapping, ttl)
+    
+    def mset_sync(self, mapping: Dict[str, str], ttl: Optional[int] = None) -> bool:
+        """
+        Set several values in memory with optional expiration without awaiting.
+        
+        Args:
+            mapping: Map of storage key to value
+            ttl: Time-to-live in seconds, applied to every key
+            
+        Returns:
+            Success indicator
+        """
+        for key, value in mapping.items():
+            self.set_sync(key, value, ttl)
+        return True
+    
     async def delete(self, key: str) -> int:
         """
         Delete a key from memory.
@@ -147,12 +458,25 @@ class MemoryStorage:
         Returns:
             Number of keys removed
         """
+        return self.delete_sync(key)
+    
+    def delete_sync(self, key: str) -> int:
+        """
+        Delete a key from memory without awaiting.
+        
+        Args:
+            key: Storage key
+            
+        Returns:
+            Number of keys removed
+        """
+        removed = self._counters.pop(key, None) is not None
         if key in self._data:
             del self._data[key]
             if key in self._expirations:
                 del self._expirations[key]
-            return 1
-        return 0
+            removed = True
+        return int(removed)
     
     async def execute_lua(self, script: str, keys: list, args: list) -> Any:
         """
@@ -168,6 +492,32 @@ class MemoryStorage:
         """
         raise NotImplementedError("Lua scripts are not supported in memory storage")
     
+    async def load_script(self, script: str) -> str:
+        """
+        Load a Lua script (not supported in memory storage).
+        
+        Args:
+            script: Lua script
+            
+        Returns:
+            Script SHA1 digest
+        """
+        raise NotImplementedError("Lua scripts are not supported in memory storage")
+        
+    async def evalsha(self, sha: str, keys: list, args: list) -> Any:
+        """
+        Execute a loaded Lua script (not supported in memory storage).
+        
+        Args:
+            sha: Script SHA1 digest
+            keys: List of keys
+            args: List of arguments
+            
+        Returns:
+            Script result
+        """
+        raise NotImplementedError("Lua scripts are not supported in memory storage")
+        
     async def close(self):
         """
         Close the memory storage (no-op).
@@ -2,8 +2,17 @@
 Redis storage adapter for rate limiting.
 """
 
-from typing import Dict, Any, Optional, Union
-import aioredis
+from typing import Dict, Any, Optional, Union, List
+import asyncio
+import functools
+from redis.asyncio import Redis, BlockingConnectionPool
+from redis.exceptions import NoScriptError
+
+# Commands that connect on first use, see RedisStorage._guard_commands
+_COMMANDS = (
+    'get', 'set', 'incr', 'expire', 'incr_with_expire', 'incr_many', 'mget',
+    'mset', 'delete', 'execute_lua', 'load_script', 'evalsha',
+)
 
 
 class RedisStorage:
@@ -11,6 +20,9 @@ class RedisStorage:
     Redis storage adapter for rate limiting.
     """
     
+    # Algorithms may run their check logic server-side via Lua scripts
+    supports_lua = True
+    
     def __init__(self, options: Dict[str, Any] = None):
         """
         Initialize Redis storage adapter.
@@ -20,13 +32,58 @@ class RedisStorage:
         """
         self.options = options or {}
         self.redis = None
+        self._pool = None
         self.connected = False
+        # Redis Cluster: algorithms put the identifier of multi-key scripts in
+        # a hash tag, so the keys of one check share a slot
+        self.cluster = bool(self.options.get('cluster', False))
+        # Resolved once, every command applies it
+        self._prefix = self.options.get('key_prefix', '')
+        self._prefix_bytes = self._prefix.encode()
+        self._scripts = {}  # Map of script SHA1 to script body
+        self._script_objects = {}  # Map of script body to registered Script
+        
+        # Script calls issued in the same event loop iteration are sent as one
+        # pipeline, i.e. one socket write and one read for the whole batch
+        self._batching = bool(self.options.get('batch_commands', False))
+        self._batch_size = int(self.options.get('batch_size', 32))
+        self._pending = []  # Queued (sha, keys, args, future) script calls
+        self._batch_tasks = set()
+        
+        self._guard_commands()
+    
+    def _guard_commands(self):
+        """
+        Shadow the commands with wrappers that connect before running them.
+        
+        connect() removes the wrappers, so once connected commands run
+        without checking the connection state on every call.
+        """
+        for name in _COMMANDS:
+            setattr(self, name, self._connect_first(getattr(type(self), name)))
+    
+    def _connect_first(self, method):
+        """
+        Wrap a command to connect before running it.
         
+        Args:
+            method: Unbound command method
+            
+        Returns:
+            Coroutine function bound to this storage
+        """
+        @functools.wraps(method)
+        async def guarded(*args, **kwargs):
+            await self.connect()
+            return await method(self, *args, **kwargs)
+        return guarded
+    
     async def connect(self):
         """
         Connect to Redis server.
         """
         if self.connected:
+            self._unguard_commands()
             return
         
         host = self.options.get('host', 'localhost')
@@ -39,17 +96,67 @@ class RedisStorage:
         if password:
             connection_string += f":{password}@"
             
-        connection_string += f"{host}:{port}/{db}"
+        connection_string += f"{host}:{port}"
         
-        self.redis = await aioredis.from_url(
+        if self.cluster:
+            # redis-py 4.3+, imported here so older releases still work
+            # without cluster mode
+            from redis.asyncio.cluster import RedisCluster
+            
+            # Discovers the other nodes from the given one and keeps a pool per
+            # node; Redis Cluster only has database 0. Node pools fail instead
+            # of waiting when full, so they are only capped if pool_size is set
+            self.redis = RedisCluster.from_url(
+                connection_string,
+                max_connections=self.options.get('pool_size', 2 ** 31),
+                encoding="utf-8",
+                decode_responses=True
+            )
+            self.connected = True
+            self._unguard_commands()
+            return
+            
+        connection_string += f"/{db}"
+        
+        # Commands share pooled connections; hiredis parses replies when installed.
+        # With all pool_size connections busy a command waits up to pool_timeout
+        # seconds for one instead of failing
+        self._pool = BlockingConnectionPool.from_url(
             connection_string,
+            max_connections=self.options.get('pool_size', 32),
+            timeout=self.options.get('pool_timeout', 20),
             encoding="utf-8",
             decode_responses=True
         )
+        self.redis = Redis(connection_pool=self._pool)
         
         self.connected = True
+        self._unguard_commands()
+    
+    def _unguard_commands(self):
+        """
+        Remove the connecting wrappers installed by _guard_commands.
+        """
+        for name in _COMMANDS:
+            self.__dict__.pop(name, None)
+    
+    def _prefixed(self, key: Union[str, bytes]) -> Union[str, bytes]:
+        """
+        Apply the configured key prefix.
+        
+        Args:
+            key: Redis key, str or bytes (bytes keys are sent as is)
+            
+        Returns:
+            Prefixed key of the same type
+        """
+        if not self._prefix:
+            return key
+        if isinstance(key, bytes):
+            return self._prefix_bytes + key
+        return self._prefix + key
     
-    async def get(self, key: str) -> Optional[str]:
+    async def get(self, key: Union[str, bytes]) -> Optional[str]:
         """
         Get a value from Redis.
         
@@ -59,15 +166,11 @@ class RedisStorage:
         Returns:
             Value or None if not found
         """
-        if not self.connected:
-            await self.connect()
-            
-        key_prefix = self.options.get('key_prefix', '')
-        prefixed_key = f"{key_prefix}{key}"
+        prefixed_key = self._prefixed(key)
         
         return await self.redis.get(prefixed_key)
     
-    async def set(self, key: str, value: str, ttl: Optional[int] = None) -> bool:
+    async def set(self, key: Union[str, bytes], value: str, ttl: Optional[int] = None) -> bool:
         """
         Set a value in Redis with optional expiration.
         
@@ -79,11 +182,7 @@ class RedisStorage:
         Returns:
             Success indicator
         """
-        if not self.connected:
-            await self.connect()
-            
-        key_prefix = self.options.get('key_prefix', '')
-        prefixed_key = f"{key_prefix}{key}"
+        prefixed_key = self._prefixed(key)
         
         if ttl:
             await self.redis.setex(prefixed_key, ttl, value)
@@ -92,7 +191,7 @@ class RedisStorage:
             
         return True
     
-    async def incr(self, key: str) -> int:
+    async def incr(self, key: Union[str, bytes]) -> int:
         """
         Increment a counter in Redis.
         
@@ -102,15 +201,11 @@ class RedisStorage:
         Returns:
             New counter value
         """
-        if not self.connected:
-            await self.connect()
-            
-        key_prefix = self.options.get('key_prefix', '')
-        prefixed_key = f"{key_prefix}{key}"
+        prefixed_key = self._prefixed(key)
         
         return await self.redis.incr(prefixed_key)
     
-    async def expire(self, key: str, ttl: int) -> int:
+    async def expire(self, key: Union[str, bytes], ttl: int) -> int:
         """
         Set expiration time on a key.
         
@@ -121,15 +216,98 @@ class RedisStorage:
         Returns:
             1 if the timeout was set, 0 if key doesn't exist
         """
-        if not self.connected:
-            await self.connect()
-            
-        key_prefix = self.options.get('key_prefix', '')
-        prefixed_key = f"{key_prefix}{key}"
+        prefixed_key = self._prefixed(key)
         
         return await self.redis.expire(prefixed_key, ttl)
     
-    async def delete(self, key: str) -> int:
+    async def incr_with_expire(self, key: Union[str, bytes], ttl: int) -> int:
+        """
+        Increment a counter and set its expiration in one pipelined round trip.
+        
+        Args:
+            key: Redis key
+            ttl: Time-to-live in seconds
+            
+        Returns:
+            New counter value
+        """
+        prefixed_key = self._prefixed(key)
+        
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.incr(prefixed_key)
+        pipe.expire(prefixed_key, ttl)
+        count, _ = await pipe.execute()
+        
+        return count
+    
+    async def incr_many(self, keys: List[Union[str, bytes]], ttl: int) -> List[int]:
+        """
+        Increment several counters and set their expiration in one pipelined
+        round trip, e.g. per IP, per user and global counters of one request.
+        
+        On a cluster the pipeline is split by node and the parts are sent
+        concurrently, so keys do not need to share a slot.
+        
+        Args:
+            keys: Redis keys
+            ttl: Time-to-live in seconds, applied to every key
+            
+        Returns:
+            New counter values in key order
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for key in keys:
+            prefixed_key = self._prefixed(key)
+            pipe.incr(prefixed_key)
+            pipe.expire(prefixed_key, ttl)
+        results = await pipe.execute()
+        
+        return results[::2]
+    
+    async def mget(self, keys: List[str]) -> List[Optional[str]]:
+        """
+        Get several values from Redis in one MGET.
+        
+        Args:
+            keys: Redis keys
+            
+        Returns:
+            Values in key order, None for missing keys
+        """
+        prefixed_keys = [self._prefixed(key) for key in keys] if self._prefix else keys
+        
+        if self.cluster:
+            # One MGET per slot instead of a CROSSSLOT error
+            return await self.redis.mget_nonatomic(prefixed_keys)
+        return await self.redis.mget(prefixed_keys)
+    
+    async def mset(self, mapping: Dict[str, str], ttl: Optional[int] = None) -> bool:
+        """
+        Set several values in Redis in one pipelined round trip.
+        
+        Args:
+            mapping: Map of Redis key to value
+            ttl: Time-to-live in seconds, applied to every key
+            
+        Returns:
+            Success indicator
+        """
+        if not ttl:
+            prefixed_mapping = {self._prefixed(key): value for key, value in mapping.items()}
+            if self.cluster:
+                await self.redis.mset_nonatomic(prefixed_mapping)
+            else:
+                await self.redis.mset(prefixed_mapping)
+            return True
+            
+        pipe = self.redis.pipeline(transaction=False)
+        for key, value in mapping.items():
+            pipe.setex(self._prefixed(key), ttl, value)
+        await pipe.execute()
+        
+        return True
+    
+    async def delete(self, key: Union[str, bytes]) -> int:
         """
         Delete a key from Redis.
         
@@ -139,11 +317,7 @@ class RedisStorage:
         Returns:
             Number of keys removed
         """
-        if not self.connected:
-            await self.connect()
-            
-        key_prefix = self.options.get('key_prefix', '')
-        prefixed_key = f"{key_prefix}{key}"
+        prefixed_key = self._prefixed(key)
         
         return await self.redis.delete(prefixed_key)
     
@@ -159,22 +333,138 @@ class RedisStorage:
         Returns:
             Script result
         """
-        if not self.connected:
-            await self.connect()
-            
         # Add prefix to keys
-        key_prefix = self.options.get('key_prefix', '')
-        prefixed_keys = [f"{key_prefix}{key}" for key in keys]
+        prefixed_keys = [self._prefixed(key) for key in keys] if self._prefix else keys
         
-        # Create a script object
-        script_obj = self.redis.register_script(script)
+        # Register each script once, later calls go through EVALSHA
+        script_obj = self._script_objects.get(script)
+        if script_obj is None:
+            script_obj = self._script_objects[script] = self.redis.register_script(script)
         
         return await script_obj(keys=prefixed_keys, args=args)
     
+    async def load_script(self, script: str) -> str:
+        """
+        Load a Lua script into the Redis script cache.
+        
+        Args:
+            script: Lua script
+            
+        Returns:
+            SHA1 digest to be passed to evalsha
+        """
+        sha = await self.redis.script_load(script)
+        self._scripts[sha] = script
+        
+        return sha
+        
+    async def evalsha(self, sha: str, keys: list, args: list) -> Any:
+        """
+        Execute a Lua script previously loaded with load_script.
+        
+        Args:
+            sha: SHA1 digest returned by load_script
+            keys: List of keys
+            args: List of arguments
+            
+        Returns:
+            Script result
+        """
+        # Add prefix to keys
+        prefixed_keys = [self._prefixed(key) for key in keys] if self._prefix else keys
+        
+        if self._batching:
+            return await self._queue_evalsha(sha, prefixed_keys, args)
+            
+        try:
+            return await self.redis.evalsha(sha, len(prefixed_keys), *prefixed_keys, *args)
+        except NoScriptError:
+            # Script cache was flushed (e.g. Redis restart), load it again
+            await self.redis.script_load(self._scripts[sha])
+            return await self.redis.evalsha(sha, len(prefixed_keys), *prefixed_keys, *args)
+    
+    def _queue_evalsha(self, sha: str, keys: list, args: list) -> asyncio.Future:
+        """
+        Queue a script call for the next batch.
+        
+        Args:
+            sha: SHA1 digest returned by load_script
+            keys: List of prefixed keys
+            args: List of arguments
+            
+        Returns:
+            Future resolved with the script result
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        
+        if not self._pending:
+            # Runs after every task already scheduled in this iteration had its turn
+            loop.call_soon(self._flush_batch)
+        self._pending.append((sha, keys, args, future))
+        
+        if len(self._pending) >= self._batch_size:
+            self._flush_batch()
+            
+        return future
+    
+    def _flush_batch(self):
+        """
+        Send the queued script calls.
+        """
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+            
+        task = asyncio.get_running_loop().create_task(self._execute_batch(batch))
+        self._batch_tasks.add(task)
+        task.add_done_callback(self._batch_tasks.discard)
+    
+    async def _execute_batch(self, batch: list):
+        """
+        Execute queued script calls in one pipeline and resolve their futures.
+        
+        Args:
+            batch: List of (sha, keys, args, future) tuples
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for sha, keys, args, _ in batch:
+            pipe.evalsha(sha, len(keys), *keys, *args)
+            
+        try:
+            results = await pipe.execute(raise_on_error=False)
+        except Exception as e:
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+            
+        for (sha, keys, args, future), result in zip(batch, results):
+            if isinstance(result, NoScriptError):
+                # Script cache was flushed (e.g. Redis restart), load it again
+                try:
+                    await self.redis.script_load(self._scripts[sha])
+                    result = await self.redis.evalsha(sha, len(keys), *keys, *args)
+                except Exception as e:
+                    result = e
+                    
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+                
     async def close(self):
         """
         Close the Redis connection.
         """
         if self.connected and self.redis:
-            await self.redis.close()
-            self.connected = False 
\ No newline at end of file
+            # aclose() replaces the deprecated close() in redis-py 5
+            close = getattr(self.redis, 'aclose', None) or self.redis.close
+            await close()
+            if self._pool is not None:
+                await self._pool.disconnect()
+            self.connected = False
+            # Reconnect on the next command
+            self._guard_commands() 
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""
+Result types for rate limiting checks.
+"""
+
+from typing import Dict, Any
+
+
+class RateLimitResult:
+    """
+    Outcome of a single rate limit check.
+    
+    Fields are also readable by name (``result['remaining']``,
+    ``result.get('remaining')``, ``'remaining' in result``) for code written
+    against the previous dict-based results.
+    """
+    
+    __slots__ = ('allowed', 'limit', 'remaining', 'reset', 'retry_after')
+    
+    def __init__(self, allowed: bool, limit: int, remaining: int, reset: int, retry_after: int):
+        """
+        Initialize the result.
+        
+        Args:
+            allowed: Whether the request is allowed
+            limit: Request rate (requests per interval)
+            remaining: Requests left in the current interval
+            reset: Seconds until the limit resets
+            retry_after: Seconds to wait before retrying (0 if allowed)
+        """
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.reset = reset
+        self.retry_after = retry_after
+    
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self.__slots__
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Get a field by name, like dict.get.
+        
+        Args:
+            key: Field name
+            default: Value returned for unknown names
+            
+        Returns:
+            Field value or default
+        """
+        if key not in self.__slots__:
+            return default
+        return getattr(self, key)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert the result to a dictionary.
+        
+        Returns:
+            Dict containing the check result and metadata
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+    
+    def __repr__(self) -> str:
+        return (f"RateLimitResult(allowed={self.allowed}, limit={self.limit}, "
+                f"remaining={self.remaining}, reset={self.reset}, "
+                f"retry_after={self.retry_after})")
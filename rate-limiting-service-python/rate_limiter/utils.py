@@ -2,7 +2,34 @@
 Utility functions for rate limiting service.
 """
 
-from typing import Dict, Any, Optional, Union
+from typing import Dict, Any, Optional, Union, List
+import functools
+import operator
+import re
+import time
+
+try:
+    # Linear-time DFA engine, no backtracking on request paths
+    import re2 as _path_re
+except ImportError:
+    _path_re = re
+
+try:
+    # Faster JSON parser; both parsers accept bytes and raise ValueError subclasses
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
+
+# Interval name to length in seconds
+INTERVALS = {
+    'second': 1,
+    'minute': 60,
+    'hour': 60 * 60,
+    'day': 24 * 60 * 60,
+    'week': 7 * 24 * 60 * 60,
+    'month': 30 * 24 * 60 * 60,
+}
 
 
 def get_interval_in_seconds(interval: str) -> int:
@@ -15,41 +42,85 @@ def get_interval_in_seconds(interval: str) -> int:
     Returns:
         Interval in seconds
     """
-    interval = interval.lower()
-    if interval == 'second':
-        return 1
-    elif interval == 'minute':
-        return 60
-    elif interval == 'hour':
-        return 60 * 60
-    elif interval == 'day':
-        return 24 * 60 * 60
-    elif interval == 'week':
-        return 7 * 24 * 60 * 60
-    elif interval == 'month':
-        return 30 * 24 * 60 * 60
-    else:
+    seconds = INTERVALS.get(interval)
+    if seconds is None:
         # Default to minute if unknown
-        return 60
+        seconds = INTERVALS.get(interval.lower(), 60)
+    return seconds
 
 
-def generate_key(prefix: str, identifier: str, resource: Optional[str] = None) -> str:
+@functools.lru_cache(maxsize=4096)
+def generate_key(prefix: str, identifier: str, resource: Optional[str] = None,
+                 cluster_safe: bool = False) -> str:
     """
     Generate a unique key for rate limiting.
     
+    Keys of recently seen clients are cached, so repeated calls return the
+    same string object without formatting it again. The cache doubles as a
+    bounded interner; keys are deliberately not passed to sys.intern, which
+    would keep every client identifier alive for the life of the process.
+    
     Args:
         prefix: Key prefix
         identifier: Unique identifier
         resource: Optional resource identifier
+        cluster_safe: Wrap the identifier in a Redis Cluster hash tag, so all
+            keys of one identifier map to the same slot
         
     Returns:
         Unique key
     """
+    if cluster_safe:
+        identifier = f"{{{identifier}}}"
     if resource:
         return f"{prefix}:{identifier}:{resource}"
     return f"{prefix}:{identifier}"
 
 
+def is_path_pattern(path: str) -> bool:
+    """
+    Check whether an endpoint override key is a pattern rather than a plain path.
+    
+    Args:
+        path: Endpoint override key
+        
+    Returns:
+        True if the key contains '{param}' segments or a '*' wildcard
+    """
+    return '{' in path or '*' in path
+
+
+def compile_path_patterns(patterns: List[str]):
+    """
+    Compile endpoint path patterns into a single regular expression.
+    
+    '{param}' matches one path segment and '*' matches any suffix. Each
+    pattern becomes its own top-level group, so the index of the matched
+    pattern is available as ``match.lastindex - 1``.
+    
+    Args:
+        patterns: Path patterns, in priority order
+        
+    Returns:
+        Compiled expression (re2 when available), or None if no patterns given
+    """
+    if not patterns:
+        return None
+        
+    alternatives = []
+    for pattern in patterns:
+        parts = re.split(r'(\{[^}/]*\}|\*)', pattern)
+        regex = ''.join(
+            '[^/]+' if part.startswith('{') else
+            '.*' if part == '*' else
+            re.escape(part)
+            for part in parts
+        )
+        alternatives.append(f"({regex})")
+        
+    return _path_re.compile('|'.join(alternatives))
+
+
 def calculate_reset(window_size: int) -> int:
     """
     Calculate the time until a window resets.
@@ -60,11 +131,15 @@ def calculate_reset(window_size: int) -> int:
     Returns:
         Seconds until window reset
     """
-    import time
     now = int(time.time())
     return window_size - (now % window_size)
 
 
+@functools.lru_cache(maxsize=64)
+def _error_message(limit: int, interval: str) -> str:
+    return f'Вы превысили лимит запросов: {limit} запросов в {interval}'
+
+
 def format_error_response(limit: int, interval: str, reset: int) -> Dict[str, Any]:
     """
     Format error response for rate limiting.
@@ -79,79 +154,155 @@ def format_error_response(limit: int, interval: str, reset: int) -> Dict[str, An
     """
     return {
         'error': 'Rate limit exceeded',
-        'message': f'Вы превысили лимит запросов: {limit} запросов в {interval}',
+        'message': _error_message(limit, interval),
         'retry_after': reset
     }
 
 
-def normalize_client_info(request) -> Dict[str, Any]:
+def _ip_from_headers(headers) -> str:
+    ip = headers.get('x-forwarded-for', headers.get('x-real-ip', 'unknown'))
+    if ip and ',' in ip:  # Handle multiple IPs in X-Forwarded-For
+        ip = ip.split(',')[0].strip()
+    return ip
+
+
+def _ip_from_remote_addr(request, headers) -> str:  # Flask
+    return getattr(request, 'remote_addr', None) or _ip_from_headers(headers)
+
+
+def _ip_from_client(request, headers) -> str:  # FastAPI
+    client = request.client
+    if hasattr(client, 'host'):
+        return client.host
+    return _ip_from_remote_addr(request, headers)
+
+
+def _user_id(request) -> Optional[Any]:
+    # Looked up per request, some applications set request.user dynamically
+    try:
+        user = getattr(request, 'user', None)
+    except AssertionError:
+        # Starlette raises AssertionError without AuthenticationMiddleware
+        return None
+    return getattr(user, 'id', None) if user else None
+
+
+def _no_headers(request) -> Dict[str, str]:
+    return {}
+
+
+def _path_from_url(request) -> str:
+    url = request.url
+    return url.path if hasattr(url, 'path') else url
+
+
+def _path_from_path(request) -> str:
+    path = request.path
+    return path.path if hasattr(path, 'path') else path
+
+
+def _default_path(request) -> str:
+    return '/'
+
+
+# Request type to (headers, ip, path) extractors, see _extractors_for
+_EXTRACTORS: Dict[type, tuple] = {}
+
+
+def _extractors_for(request) -> tuple:
     """
-    Normalize client information from request.
+    Pick the attribute extractors for a request's type.
     
     Args:
         request: Request object (Flask, FastAPI, etc.)
         
     Returns:
-        Normalized client info
+        Tuple of (headers, ip, path) extractor functions
     """
-    # Try to handle different web frameworks
-    headers = getattr(request, 'headers', {})
+    headers_fn = operator.attrgetter('headers') if hasattr(request, 'headers') else _no_headers
+    ip_fn = _ip_from_client if hasattr(request, 'client') else _ip_from_remote_addr
     
-    # Extract IP address
-    if hasattr(request, 'client') and hasattr(request.client, 'host'):  # FastAPI
-        ip = request.client.host
-    elif getattr(request, 'remote_addr', None):  # Flask
-        ip = request.remote_addr
+    if hasattr(request, 'path'):
+        # Plain string paths (Flask) need no URL object check
+        path_fn = operator.attrgetter('path') if isinstance(request.path, str) else _path_from_path
+    elif hasattr(request, 'url'):
+        path_fn = _path_from_url
     else:
-        ip = headers.get('x-forwarded-for', headers.get('x-real-ip', 'unknown'))
-        if ip and ',' in ip:  # Handle multiple IPs in X-Forwarded-For
-            ip = ip.split(',')[0].strip()
+        path_fn = _default_path
+        
+    extractors = _EXTRACTORS[type(request)] = (headers_fn, ip_fn, path_fn)
+    return extractors
+
+
+def normalize_client_info(request) -> Dict[str, Any]:
+    """
+    Normalize client information from request.
+    
+    How each value is read is decided once per request type, later requests
+    of the same type skip the attribute probing.
     
-    # Extract user ID
-    user_id = None
-    user = getattr(request, 'user', None)
-    if user:
-        user_id = getattr(user, 'id', None)
+    Args:
+        request: Request object (Flask, FastAPI, etc.)
+        
+    Returns:
+        Normalized client info
+    """
+    extractors = _EXTRACTORS.get(type(request))
+    if extractors is None:
+        extractors = _extractors_for(request)
+    headers_fn, ip_fn, path_fn = extractors
     
-    # Extract path
-    path = getattr(request, 'path', getattr(request, 'url', '/'))
-    if hasattr(path, 'path'):  # Handle URL objects
-        path = path.path
+    headers = headers_fn(request)
     
     return {
-        'ip': ip,
-        'user_id': user_id,
+        'ip': ip_fn(request, headers),
+        'user_id': _user_id(request),
         'api_key': headers.get('x-api-key'),
         'user_agent': headers.get('user-agent', 'unknown'),
-        'path': path
+        'path': path_fn(request)
     }
 
 
-def normalize_config(config: Dict[str, Any]) -> Dict[str, Any]:
+def normalize_config_inplace(config: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Parse configuration values to ensure correct types.
+    Parse configuration values to ensure correct types, updating the given dict.
+    
+    Use when the caller owns the config; see normalize_config otherwise.
     
     Args:
         config: Configuration object
         
     Returns:
-        Normalized configuration
+        The same configuration object, normalized
     """
     rate = config.get('rate')
-    if rate is not None:
-        try:
-            rate = int(rate)
-        except (ValueError, TypeError):
+    # Common case: the rate is already an int
+    if not isinstance(rate, int):
+        if rate is not None:
+            try:
+                rate = int(rate)
+            except (ValueError, TypeError):
+                rate = 60
+        else:
             rate = 60
-    else:
-        rate = 60
+        config['rate'] = rate
+        
+    config.setdefault('interval', 'minute')
+    config.setdefault('enabled', True)
+    return config
+
+
+def normalize_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Parse configuration values to ensure correct types.
     
-    return {
-        **config,
-        'rate': rate,
-        'interval': config.get('interval', 'minute'),
-        'enabled': config.get('enabled', True)
-    }
+    Args:
+        config: Configuration object
+        
+    Returns:
+        Normalized copy of the configuration
+    """
+    return normalize_config_inplace(dict(config))
 
 
 def load_config_from_file(config_path: str) -> Dict[str, Any]:
@@ -164,14 +315,9 @@ def load_config_from_file(config_path: str) -> Dict[str, Any]:
     Returns:
         Configuration dictionary
     """
-    import json
-    import os
-    
-    if not os.path.exists(config_path):
-        return {}
-    
+    # A missing file is handled like any other read error, one syscall fewer
     try:
-        with open(config_path, 'r') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, IOError):
-        return {} 
\ No newline at end of file
+        with open(config_path, 'rb') as f:
+            return _json_loads(f.read())
+    except (ValueError, OSError):
+        return {}
\ No newline at end of file
@@ -30,11 +30,21 @@ setup(
     ],
     python_requires=">=3.7",
     install_requires=[
-        "aioredis>=2.0.0",
+        "redis[hiredis]>=4.2.0",
         "fastapi>=0.68.0",
         "flask>=2.0.0",
     ],
     extras_require={
+        "jit": [
+            "numba>=0.50",
+            "numpy>=1.17",
+        ],
+        "re2": [
+            "google-re2>=1.0",
+        ],
+        "json": [
+            "orjson>=3.0",
+        ],
         "dev": [
             "pytest>=6.0.0",
             "pytest-asyncio>=0.15.0",
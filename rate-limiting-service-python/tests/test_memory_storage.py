@@ -0,0 +1,50 @@
+"""
+MemoryStorage expiration bookkeeping.
+"""
+
+import pytest
+
+from rate_limiter import MemoryStorage, SlidingWindow
+from rate_limiter.storage import memory_storage
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(memory_storage.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_str_and_bytes_keys_expiring_in_the_same_second(clock):
+    storage = MemoryStorage()
+    algorithm = SlidingWindow(storage)
+    
+    # Custom str-keyed counters next to the algorithms' bytes keys, all
+    # expiring in the same second
+    storage.incr_many_sync(['login:alice', 'login:bob'], 120)
+    for i in range(50):
+        assert algorithm.check_sync(f"ip:10.0.0.{i}", {'rate': 5, 'interval': 'minute'}).allowed
+    storage.set_sync('session:alice', 'x', 120)
+    storage.set_sync(b'session:bob', 'y', 120)
+    
+    clock[0] += 121
+    assert storage.get_sync('login:alice') is None
+    assert storage.get_sync(b'session:bob') is None
+    
+    # Sweeping removes due keys of both types
+    for _ in range(10):
+        storage.get_sync('missing')
+    assert not storage._counters
+    assert not storage._data
+
+
+def test_get_returns_str_like_redis():
+    storage = MemoryStorage()
+    
+    storage.incr_sync('plain')
+    storage.incr_with_expire_sync('expiring', 60)
+    storage.set_sync(b'tb:client', (4.5, 1700000000000), 60)
+    
+    assert storage.get_sync('plain') == '1'
+    assert storage.mget_sync(['expiring', b'tb:client', 'missing']) == ['1', '4.5|1700000000000', None]
+    assert storage._get_native(b'tb:client') == (4.5, 1700000000000)
@@ -0,0 +1,69 @@
+"""
+Synchronous checks run in the calling thread; limits must hold when several
+threads check the same clients at once.
+"""
+
+import asyncio
+import sys
+import threading
+
+import pytest
+
+from rate_limiter import AtomicMemoryStorage, MemoryStorage, SlidingWindow, TokenBucket
+
+THREADS = 8
+# Every thread checks each client a few times, walking the clients in the
+# same order, so each fresh limit is raced for by all threads
+CLIENTS = [f"ip:10.0.{i // 256}.{i % 256}" for i in range(200)]
+CHECKS_PER_CLIENT = 4
+RATE = 2
+
+
+@pytest.fixture(autouse=True)
+def frequent_thread_switches():
+    # Switch threads often so an unguarded read-modify-write interleaves
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def run_threads(check):
+    allowed = []
+    barrier = threading.Barrier(THREADS)
+    
+    def worker():
+        barrier.wait()
+        allowed.append(sum(
+            check(client) for client in CLIENTS for _ in range(CHECKS_PER_CLIENT)))
+            
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(allowed)
+
+
+@pytest.mark.parametrize('storage_cls', [MemoryStorage, AtomicMemoryStorage])
+@pytest.mark.parametrize('algorithm_cls', [TokenBucket, SlidingWindow])
+def test_check_sync_limit_holds_across_threads(storage_cls, algorithm_cls):
+    algorithm = algorithm_cls(storage_cls())
+    options = {'rate': RATE, 'interval': 'hour'}
+    
+    allowed = run_threads(lambda client: algorithm.check_sync(client, options).allowed)
+    
+    assert allowed == RATE * len(CLIENTS)
+
+
+@pytest.mark.parametrize('storage_cls', [MemoryStorage, AtomicMemoryStorage])
+def test_check_many_limit_holds_across_threads(storage_cls):
+    algorithm = TokenBucket(storage_cls())
+    options = [{'rate': RATE, 'interval': 'hour'}, {'rate': 1_000_000, 'interval': 'hour'}]
+    
+    def check(client):
+        results = asyncio.run(algorithm.check_many([client, 'global'], options))
+        assert results[1].allowed
+        return results[0].allowed
+        
+    assert run_threads(check) == RATE * len(CLIENTS)